@@ -30,6 +30,8 @@ on any theory of liability, whether in contract, strict liability, or tort
 software, even if advised of the possibility of such damage.
 """
 
+import re
+
 
 class Ligature:
     """A ligature is defined by a glyph which is just a string."""
@@ -66,3 +68,115 @@ LIGS = [ff, fi, fl, ffi, ffl, ft, fb, fh, fk, fj, fff, th]
 
 """List of all ligatures consisting of exactly two letters"""
 LIGS_TWO_GLYPHS = [lig for lig in LIGS if len(lig) == 2]
+
+
+class PatternMatcher:
+    """Finds all occurrences of a set of patterns (strings) in a word in a
+    single pass. The patterns are compiled into a trie, which in turn is
+    compiled into a regular expression (so the automaton is run by the regex
+    engine, which follows only the branches of the trie matching the word).
+    If case_sensitive is False, patterns and words are compared in lowercase
+    (positions still refer to the word, since lower() keeps the length).
+    """
+
+    def __init__(self, patterns, case_sensitive=True):
+        self.case_sensitive = case_sensitive
+        self.patterns = {} # key (lowercase if not case_sensitive) -> patterns
+        for pattern in patterns:
+            if not pattern: continue
+            key = pattern
+            if not case_sensitive: key = key.lower()
+            same_key = self.patterns.setdefault(key, [])
+            if pattern not in same_key: same_key.append(pattern)
+        expression = patterns_expression(self.patterns)
+        # a lookahead, s.t. overlapping occurrences are found as well
+        self.regex = re.compile('(?=(' + expression + '))')
+        # key -> all patterns which are a prefix of it (shortest first)
+        self.prefixes = dict([(key, [pattern for n in range(1, len(key) + 1)
+                                     for pattern in self.patterns.get(key[:n], [])])
+                              for key in self.patterns])
+
+    def find_all(self, word):
+        """Returns a list of (position, pattern) tuples for all occurrences
+        of all patterns in the word, ordered by position (and length)."""
+        if not self.case_sensitive: word = word.lower()
+        found = []
+        for match in self.regex.finditer(word):
+            position = match.start()
+            for pattern in self.prefixes[match.group(1)]:
+                found.append((position, pattern))
+        return found
+
+    def contains_any(self, word):
+        """Returns true if the word contains any of the patterns."""
+        if not self.case_sensitive: word = word.lower()
+        return self.regex.search(word) is not None
+
+    def __getstate__(self):
+        """Returns the state for pickling (e.g. in the cache of the rules),
+        with the source of the regular expression instead of the compiled one,
+        s.t. unpickling needn't build the trie again (cf. __setstate__)."""
+        state = dict(self.__dict__)
+        state['regex'] = (self.regex.pattern, self.regex.flags)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.regex = re.compile(*state['regex'])
+
+
+class SubstringIndex:
+    """Finds all occurrences of a (large) set of patterns (strings) in a word,
+    like PatternMatcher, but without compiling a regular expression, which
+    takes long for many thousands of patterns: the trie of the patterns is
+    kept as the set of all their prefixes, which is followed from every
+    position of the word as long as it matches a prefix of a pattern.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = set([pattern for pattern in patterns if pattern])
+        self.prefixes = set([pattern[:n] for pattern in self.patterns
+                             for n in range(1, len(pattern) + 1)])
+
+    def find_all(self, word):
+        """Returns a list of (position, pattern) tuples for all occurrences
+        of all patterns in the word, ordered by position (and length)."""
+        (prefixes, patterns) = (self.prefixes, self.patterns)
+        found = []
+        for start in range(len(word)):
+            for end in range(start + 1, len(word) + 1):
+                part = word[start:end]
+                if part not in prefixes: break
+                if part in patterns: found.append((start, part))
+        return found
+
+
+def patterns_expression(patterns):
+    """Returns a regular expression matching the longest of the patterns
+    (strings) which is a prefix of the input, compiled from their trie."""
+    trie = {}
+    for pattern in patterns:
+        node = trie
+        for char in pattern:
+            node = node.setdefault(char, {})
+        node[None] = True # end of a pattern
+    if trie: return trie_expression(trie)
+    else: return '(?!)' # matches nothing
+
+
+def trie_expression(node):
+    """Returns a regular expression for a (sub)trie, matching the longest key
+    which is a prefix of the input."""
+    alternatives = [re.escape(char) + trie_expression(node[char])
+                    for char in sorted(node) if char is not None]
+    if not alternatives: return ''
+    if len(alternatives) == 1 and None not in node: return alternatives[0]
+    expression = '(?:' + '|'.join(alternatives) + ')'
+    if None in node: expression += '?' # greedy, i.e. longer keys first
+    return expression
+
+
+"""Matchers for all ligatures, case sensitive and ignoring the case"""
+LIG_MATCHER = PatternMatcher([lig.glyph for lig in LIGS])
+LIG_MATCHER_IGNORE_CASE = PatternMatcher([lig.glyph for lig in LIGS],
+                                         case_sensitive=False)
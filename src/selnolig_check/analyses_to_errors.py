@@ -33,6 +33,8 @@ software, even if advised of the possibility of such damage.
 
 import codecs
 from time import time
+from Ligatures import LIGS_TWO_GLYPHS
+from records import analysis_parts
 start = time()
 
 """-------------------------------------------------
@@ -43,15 +45,14 @@ Basic definitions
 input file
 """
 infilename = '03-analyses/analyses.bad'
-infile = codecs.open(infilename, 'r', 'utf-8')
-len_infile =  sum(1 for line in codecs.open(infilename, 'r', 'utf-8'))
+len_infile = 0 # number of input lines, counted by main
 
 
 """
-Glyph groups
-TODO: Replace these by the Ligature classes
+Glyph groups (the glyphs of Ligatures.LIGS_TWO_GLYPHS:
+ff, fi, fl, ft, fb, fh, fk, fj, th)
 """
-LIGS = [u'ff', u'fi', u'fl', u'ft', u'fb', u'fh', u'fk', u'fj', u'th'] # u'ffi', u'ffl', u'fff'
+LIGS = [lig.glyph for lig in LIGS_TWO_GLYPHS]
     # omitting the triple ligatures because they're covered by the doubles
 LC_UMLS = [u'ä', u'ö', u'ü', u'ß'] # "lower case umlauts"
 REPL_LC_UMLS = [u'ae', u'oe', u'ue', u'ss'] # "replacement lower case umlauts"
@@ -613,7 +614,33 @@ def print_stats():
     print u'runtime: ' + str(time() - start) + u's'
 
 
-def main():
+def process_parts(parts):
+    """This function processes the "parts" of an input line, i.e. puts the
+    morpheme boundaries of the line into their categories.
+    """
+    global lines_processed
+    num_parts = numerate_ligs(parts)
+    parts = remove_hi_freq_bugs(num_parts)
+    sort_ligs(parts)
+    lines_processed += 1
+
+
+def process_records(records):
+    """This function processes AnalysisRecords (cf. records) instead of the
+    lines of the input file, e.g. as they are yielded by
+    morphemes_to_analyses.bad_analyses (cf. pipeline), and writes all the
+    output files.
+    """
+    global len_infile
+    create_buglists()
+    for record in records:
+        len_infile += 1
+        process_parts(analysis_parts(record))
+    writetofiles()
+    print_stats()
+
+
+def main(infilename=infilename):
     """This is the main function, which executes all second order functions defined
     so far.
 
@@ -623,17 +650,15 @@ def main():
     if i <= 0:
         process all lines (I prefer to use -1 for this case)
     """
-    global lines_processed
+    global len_infile
+    len_infile = sum(1 for line in codecs.open(infilename, 'r', 'utf-8'))
+    infile = codecs.open(infilename, 'r', 'utf-8')
     i = -1
     create_buglists()
     for line in infile:
         #print line # uncomment for debugging. (Don't forget to change i ;-)
         line = line.rstrip(u'\n') # remove trailing newline symbol
-        simple_parts = splitline(line)
-        num_parts = numerate_ligs(simple_parts)
-        parts = remove_hi_freq_bugs(num_parts)
-        sort_ligs(parts)
-        lines_processed += 1
+        process_parts(splitline(line))
         i -= 1
         if i == 0:
             print u'\n-- testrun done --\n'
@@ -642,4 +667,5 @@ def main():
     print_stats()
     infile.close()
 
-main()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,456 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+This module serves to apply smor (or more precisely: fst-infl2) to the ligdict
+and to write the output to 01-smor/smor, like the script ligdict_to_smor, but
+using several analyzer processes in parallel.
+
+The analyzer processes are started once and kept running: the words are fed
+to them through pipes in batches, each batch being followed by a sentinel word.
+The output of a batch is read up to the record ('> word') of the sentinel word,
+so the analyzer has to flush its output at least after every line of input
+(an analyzer using buffered C stdio may be run with 'stdbuf -oL', cf.
+ANALYZER_COMMAND).
+
+Version: 0.1
+
+
+Copyright (c) 2012-2013, Steffen Hildebrandt and Felix Lehmann
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+This software is provided by the copyright holders and contributors "as is" and
+any express or implied warranties, including, but not limited to, the implied
+warranties of merchantability and fitness for a particular purpose are
+disclaimed. In no event shall the copyright owner or contributors be liable for
+any direct, indirect, incidental, special, exemplary, or consequential damages
+(including, but not limited to, procurement of substitute goods or services;
+loss of use, data, or profits; or business interruption) however caused and
+on any theory of liability, whether in contract, strict liability, or tort
+(including negligence or otherwise) arising in any way out of the use of this
+software, even if advised of the possibility of such damage.
+"""
+
+import os
+import Queue
+import anydbm
+import whichdb
+import hashlib
+import threading
+import subprocess
+from time import time
+
+"""
+The command starting an analyzer, which reads words (one per line) from stdin
+and writes their analyses to stdout. It may be replaced by a stub, e.g.
+['python', 'ligdict_to_smor__stub.py'] (cf. ligdict_to_smor__stub).
+stdbuf -oL makes fst-infl2 flush its output after every line.
+fst-infl2 options:
+-b Print surface and analysis symbols
+-q Suppress status messages
+"""
+ANALYZER_COMMAND = ['stdbuf', '-oL',
+                    './98-SMOR_binaries/windows/fst-infl2', '-b', '-q',
+                    './98-SMOR_binaries/lib/smor.ca']
+
+"""
+Number of analyzer processes
+"""
+PROCESSES = 4
+
+"""
+Number of words fed to an analyzer at once
+"""
+BATCH_SIZE = 1000
+
+"""
+Maximal number of batches which have been read from the ligdict but whose
+analyses have not been written yet, per analyzer process
+(i.e. the ligdict is not read faster than the analyzers can process it)
+"""
+PENDING_BATCHES = 2
+
+"""
+How often an analyzer is restarted for the same batch if it crashes
+"""
+MAX_RESTARTS = 3
+
+"""
+The word following every batch; its record marks the end of the batch
+"""
+SENTINEL = 'selnoligcheckendofbatch'
+
+"""
+Definition of input and output files.
+If the ligdict was also written in chunks (ligdict.chunks/, cf. CHUNK_WORDS in
+ligs_to_ligdict), only the chunks which have not been analyzed before are
+analyzed: the analyses are kept in 01-smor/chunks/ (named like the chunks) and
+concatenated to 01-smor/smor in the order of ligdict.chunks/MANIFEST.
+"""
+LIGDICT = '../01-Testing-Dictionary/ligdict'
+OUTFILE = './01-smor/smor'
+SMOR_CHUNKS = './01-smor/chunks'
+
+"""
+Cache of the analyses (None for no cache): a dbm file (cf. anydbm) from the
+fingerprint of the analyzer and a word to the lines of the analysis of the
+word, s.t. only words which haven't been analyzed by the same analyzer before
+are sent to it
+"""
+CACHE = './01-smor/cache'
+
+"""
+The dbm modules a new cache is created with, the first one available
+(cf. open_cache); dumbdbm writes to its files for every word added
+"""
+CACHE_MODULES = ['gdbm', 'dbm', 'dumbdbm']
+
+
+class AnalyzerError(Exception):
+    pass
+
+
+class Analyzer:
+    """A long-running analyzer process."""
+
+    def __init__(self, command):
+        self.command = command
+        self.restarts = 0
+        self.start()
+
+    def start(self):
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE)
+
+    def stop(self):
+        try:
+            self.process.stdin.close()
+        except IOError:
+            pass
+        self.process.wait()
+
+    def restart(self):
+        self.restarts += 1
+        try:
+            self.process.kill()
+        except OSError:
+            pass
+        self.stop()
+        self.start()
+
+    def feed(self, words):
+        """Writes the words and the sentinel to the analyzer (in its own thread,
+        s.t. the analyzer never blocks on a full output pipe)."""
+        try:
+            self.process.stdin.write(''.join(words) + SENTINEL + '\n')
+            self.process.stdin.flush()
+        except IOError:
+            pass # the analyzer crashed, cf. analyze
+
+    def analyze(self, words):
+        """Takes a batch of (latin-1 encoded) lines with one word each and returns
+        the lines of their analyses. Raises an AnalyzerError if the analyzer
+        terminates before it has analyzed the batch."""
+        feeder = threading.Thread(target=self.feed, args=(words,))
+        feeder.daemon = True
+        feeder.start()
+        stdout = self.process.stdout
+        sentinel = '> ' + SENTINEL + '\n'
+        # skip the rest of the output for the previous sentinel
+        line = stdout.readline()
+        while line and not line.startswith('> '):
+            line = stdout.readline()
+        result = []
+        while line and line != sentinel:
+            result.append(line)
+            line = stdout.readline()
+        feeder.join()
+        if not line:
+            raise AnalyzerError('analyzer terminated with exit code ' +
+                                str(self.process.wait()))
+        return result
+
+    def analyze_with_restarts(self, words):
+        """analyze, restarting the analyzer (at most MAX_RESTARTS times) if it
+        crashes."""
+        for attempt in range(MAX_RESTARTS + 1):
+            try:
+                return self.analyze(words)
+            except AnalyzerError as e:
+                print 'WARNING: ' + str(e) + ', restarting it'
+                self.restart()
+        raise AnalyzerError('analyzer crashed ' + str(MAX_RESTARTS + 1) +
+                            ' times on the same batch')
+
+
+def worker(analyzer, batches, results):
+    """Analyzes the batches from the queue until it gets None and puts them
+    together with their results (the lines or the exception) to the result
+    queue."""
+    while True:
+        batch = batches.get()
+        if batch is None:
+            break
+        try:
+            result = analyzer.analyze_with_restarts(batch[-1])
+        except Exception as e:
+            result = e
+        results.put(batch[:-1] + (result,))
+    analyzer.stop()
+
+
+def read_words(infile):
+    """Yields the (latin-1 encoded) words of an input file."""
+    for line in open(infile, 'rb'):
+        word = line.rstrip('\r\n')
+        if word != SENTINEL:
+            yield word
+
+
+def read_batches(infiles, pending):
+    """Yields the batches (index, index of the input file, last, words) of the
+    input files, last being true for the last batch of each file (which may be
+    empty). pending is acquired for each batch (and released when the batch
+    has been written)."""
+    index = 0
+    for (n, infile) in enumerate(infiles):
+        words = []
+        for word in read_words(infile):
+            words.append(word + '\n')
+            if len(words) == BATCH_SIZE:
+                pending.acquire()
+                yield (index, n, False, words)
+                index += 1
+                words = []
+        pending.acquire()
+        yield (index, n, True, words)
+        index += 1
+
+
+def analyze_files(infiles, outfiles, processes=PROCESSES,
+                  command=ANALYZER_COMMAND):
+    """Analyzes the input files with the given number of analyzer processes
+    and writes the analyses of each input file to the corresponding output
+    file, keeping the order of the words.
+    Returns the number of restarts of the analyzers."""
+    if not infiles:
+        return 0
+    batches = Queue.Queue()
+    results = Queue.Queue()
+    pending = threading.Semaphore(processes * PENDING_BATCHES)
+    analyzers = [Analyzer(command) for n in range(processes)]
+    workers = [threading.Thread(target=worker, args=(analyzer, batches, results))
+               for analyzer in analyzers]
+
+    def feed():
+        for batch in read_batches(infiles, pending):
+            if batch[-1]:
+                batches.put(batch)
+            else:
+                results.put(batch[:-1] + ([],))
+    feeder = threading.Thread(target=feed)
+    for thread in workers + [feeder]:
+        thread.daemon = True
+        thread.start()
+
+    # write the results in the order of the batches
+    done = {}
+    next_index = 0
+    out_file = None
+    written = 0 # number of output files written completely
+    while written < len(infiles):
+        (index, n, last, result) = results.get()
+        done[index] = (n, last, result)
+        while next_index in done:
+            (n, last, result) = done.pop(next_index)
+            if isinstance(result, Exception):
+                raise result
+            if out_file is None:
+                out_file = open(outfiles[n] + '.tmp', 'wb')
+            out_file.writelines(result)
+            if last:
+                out_file.close()
+                out_file = None
+                os.rename(outfiles[n] + '.tmp', outfiles[n])
+                written += 1
+            pending.release()
+            next_index += 1
+
+    for thread in workers:
+        batches.put(None)
+    for thread in workers + [feeder]:
+        thread.join()
+    return sum([analyzer.restarts for analyzer in analyzers])
+
+
+def fingerprint(command):
+    """Returns the sha1 hash of the analyzer command and of the contents of all
+    files occurring in it (the analyzer and the transducer), i.e. a new
+    version of either of them gets a new fingerprint."""
+    sha1 = hashlib.sha1()
+    for arg in command:
+        sha1.update(arg + '\0')
+        if os.path.isfile(arg):
+            f = open(arg, 'rb')
+            for block in iter(lambda: f.read(1 << 20), ''):
+                sha1.update(block)
+            f.close()
+    return sha1.hexdigest()
+
+
+def split_records(lines):
+    """Takes the lines of the analyzer output and yields its records, i.e. the
+    lines for one word ('> word' and the analyses)."""
+    record = []
+    for line in lines:
+        if line.startswith('> ') and record:
+            yield record
+            record = []
+        record.append(line)
+    if record:
+        yield record
+
+
+def open_cache(cache_file):
+    """Opens the cache, which is created with the first available module of
+    CACHE_MODULES if it doesn't exist (an existing one is opened with the
+    module it was written by, cf. anydbm). A warning is printed if the cache
+    is a dumbdbm file, since it gets slow for many words (anydbm falls back to
+    it silently)."""
+    kind = whichdb.whichdb(cache_file)
+    if kind is None: # no cache yet
+        for kind in CACHE_MODULES:
+            try:
+                module = __import__(kind)
+            except ImportError:
+                continue
+            cache = module.open(cache_file, 'c')
+            break
+        else:
+            raise Exception('None of the dbm modules ' + ', '.join(CACHE_MODULES) +
+                            ' is available for the cache ' + cache_file)
+    else:
+        cache = anydbm.open(cache_file, 'c')
+    if kind == 'dumbdbm':
+        print ('Warning: the cache ' + cache_file + ' is a dumbdbm file, which ' +
+               'gets slow for many words (with gdbm or dbm available, it is ' +
+               'created anew with them once it is deleted)')
+    return cache
+
+
+def analyze_files_cached(infiles, outfiles, processes=PROCESSES,
+                         command=ANALYZER_COMMAND, cache_file=CACHE):
+    """analyze_files, but only the words which are not in the cache are sent
+    to the analyzers (their analyses are added to the cache); then the output
+    files are written from the cache.
+    Returns the number of restarts of the analyzers."""
+    prefix = fingerprint(command) + '\t' # the keys are prefix + word
+    cache = open_cache(cache_file)
+    miss_files = [outfile + '.misses' for outfile in outfiles]
+    (words, misses) = (0, 0)
+    for (infile, miss_file) in zip(infiles, miss_files):
+        out_file = open(miss_file, 'wb')
+        for word in read_words(infile):
+            words += 1
+            if not cache.has_key(prefix + word):
+                misses += 1
+                out_file.write(word + '\n')
+        out_file.close()
+
+    (restarts, runtime) = (0, 0)
+    if misses:
+        start = time()
+        restarts = analyze_files(miss_files, [f + '.smor' for f in miss_files],
+                                 processes, command)
+        runtime = time() - start
+    for miss_file in miss_files:
+        if misses:
+            missed = list(read_words(miss_file))
+            records = list(split_records(open(miss_file + '.smor', 'rb')))
+            if len(records) != len(missed):
+                raise Exception('The analyzer wrote ' + str(len(records)) +
+                                ' records for ' + str(len(missed)) + ' words')
+            for (word, record) in zip(missed, records):
+                cache[prefix + word] = ''.join(record)
+            os.remove(miss_file + '.smor')
+        os.remove(miss_file)
+
+    # the time per word of the last run with misses, for estimating the time saved
+    time_key = 'seconds per word\t' + prefix
+    if misses:
+        cache[time_key] = repr(runtime / misses)
+    hits = words - misses
+    print ('Cache: ' + str(hits) + ' of ' + str(words) + ' words (' +
+           str(round(100.0 * hits / max(words, 1), 1)) + '%)')
+    if cache.has_key(time_key):
+        print ('Estimated time saved by the cache: ' +
+               str(hits * float(cache[time_key])) + 's')
+
+    for (infile, outfile) in zip(infiles, outfiles):
+        out_file = open(outfile + '.tmp', 'wb')
+        for word in read_words(infile):
+            out_file.write(cache[prefix + word])
+        out_file.close()
+        os.rename(outfile + '.tmp', outfile)
+    cache.close()
+    return restarts
+
+
+def analyze(infiles, outfiles, processes, command, cache_file):
+    """analyze_files_cached if there is a cache file, else analyze_files."""
+    if cache_file:
+        return analyze_files_cached(infiles, outfiles, processes, command,
+                                    cache_file)
+    return analyze_files(infiles, outfiles, processes, command)
+
+
+def main(ligdict=LIGDICT, outfile=OUTFILE, processes=PROCESSES,
+         command=ANALYZER_COMMAND, cache_file=CACHE):
+    """Analyzes the ligdict (or the chunks of it which have not been analyzed
+    yet, using the cache if a cache file is given) and writes the analyses to
+    the output file."""
+    start = time()
+
+    manifest = ligdict + '.chunks/MANIFEST'
+    if os.path.exists(manifest):
+        chunks = [line.strip() for line in open(manifest)]
+        if not os.path.isdir(SMOR_CHUNKS):
+            os.makedirs(SMOR_CHUNKS)
+        missing = [chunk for chunk in chunks
+                   if not os.path.exists(os.path.join(SMOR_CHUNKS, chunk))]
+        # the same chunk may occur several times
+        missing = sorted(set(missing))
+        restarts = analyze(
+            [os.path.join(ligdict + '.chunks', chunk) for chunk in missing],
+            [os.path.join(SMOR_CHUNKS, chunk) for chunk in missing],
+            processes, command, cache_file)
+        out_file = open(outfile, 'wb')
+        for chunk in chunks:
+            chunk_file = open(os.path.join(SMOR_CHUNKS, chunk), 'rb')
+            out_file.writelines(chunk_file)
+            chunk_file.close()
+        out_file.close()
+        # remove the analyses of chunks which are no longer in the ligdict
+        names = set(chunks)
+        for name in os.listdir(SMOR_CHUNKS):
+            if name not in names:
+                os.remove(os.path.join(SMOR_CHUNKS, name))
+        print 'Analyzed', len(missing), 'of', len(chunks), 'chunks'
+    else:
+        restarts = analyze([ligdict], [outfile], processes, command,
+                           cache_file)
+
+    if restarts:
+        print 'Restarted analyzers', restarts, 'times'
+    print 'Runtime: ' + str(time()-start) + 's'
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+This module serves as a stand-in for SMOR (fst-infl2 -b -q) when testing
+ligdict_to_smor: it reads words (one per line) from stdin and writes a record
+'> word' and a fake analysis 'word<+NN>' for each of them to stdout, flushing
+after every word.
+If a crash rate is given as argument, it terminates with that probability
+after every word (for testing the restarts of ligdict_to_smor).
+
+Version: 0.1
+
+
+Copyright (c) 2012-2013, Steffen Hildebrandt and Felix Lehmann
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+This software is provided by the copyright holders and contributors "as is" and
+any express or implied warranties, including, but not limited to, the implied
+warranties of merchantability and fitness for a particular purpose are
+disclaimed. In no event shall the copyright owner or contributors be liable for
+any direct, indirect, incidental, special, exemplary, or consequential damages
+(including, but not limited to, procurement of substitute goods or services;
+loss of use, data, or profits; or business interruption) however caused and
+on any theory of liability, whether in contract, strict liability, or tort
+(including negligence or otherwise) arising in any way out of the use of this
+software, even if advised of the possibility of such damage.
+"""
+
+import sys
+import random
+
+
+def main(crash_rate=0.0):
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        word = line.rstrip('\r\n')
+        sys.stdout.write('> ' + word + '\n')
+        sys.stdout.write(word + '<+NN>\n')
+        sys.stdout.flush()
+        if random.random() < crash_rate:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(float(sys.argv[1]))
+    else:
+        main()
@@ -31,27 +31,90 @@ on any theory of liability, whether in contract, strict liability, or tort
 software, even if advised of the possibility of such damage.
 """
 
+import os
 import re
 import codecs
+import cPickle
 import operator
 from time import time
+from collections import Counter
+from itertools import islice
+from StringIO import StringIO
+from multiprocessing import Pool
 from morphemes_to_analyses__read_selnolig_patterns import *
+import morphemes_to_analyses__read_selnolig_patterns as patterns
+from records import *
 
 """
 Definition of input, output, and statistic files
 """
-(nolig, keeplig) = read_rules('selnolig-german-patterns.sty')
-morph_dict = codecs.open('02-morphemes/morphemes.good', 'r', 'utf-8')
+PATTERN_FILE = 'selnolig-german-patterns.sty'
+INFILE = '02-morphemes/morphemes.good'
 
-out_good = codecs.open('03-analyses/analyses.good', 'wb', 'utf-8')
-out_bad = codecs.open('03-analyses/analyses.bad', 'wb', 'utf-8')
+out_good = '03-analyses/analyses.good'
+out_bad = '03-analyses/analyses.bad'
 
-out_stats_good = codecs.open(
-                '03-analyses/stats.analyses.good', 'wb', 'utf-8')
-out_stats_type2single = codecs.open(
-                '03-analyses/stats.analyses.type2single', 'wb', 'utf-8')
-out_stats_type2multiple = codecs.open(
-                '03-analyses/stats.analyses.type2multiple', 'wb', 'utf-8')
+out_stats_good = '03-analyses/stats.analyses.good'
+out_stats_type2single = '03-analyses/stats.analyses.type2single'
+out_stats_type2multiple = '03-analyses/stats.analyses.type2multiple'
+
+"""
+Whether only the words affected by the changes of the rules since the last
+run are analyzed again (cf. update_analyses), using the index of the rules
+which every run with INCREMENTAL set writes to INDEX_FILE (cf. write_index).
+This costs memory and disk space: the index is about half as large as the
+input file, and update_analyses keeps the input file and both output files
+in memory (about 350 MB instead of 115 MB for the 420,000 words of a full
+morphemes.good), so it is off by default.
+"""
+INCREMENTAL = False
+INDEX_FILE = '03-analyses/rules.index'
+
+"""
+Version of the index, which has to be increased whenever its contents change,
+s.t. old indexes are not used anymore
+"""
+INDEX_VERSION = 1
+
+"""
+Number of processes analyzing the words, in chunks of CHUNK_WORDS words
+(cf. analyze_chunk). The worker processes inherit the rules from the main
+process, so more than one process requires fork (i.e. not Windows).
+"""
+PROCESSES = 1
+CHUNK_WORDS = 10000
+
+
+"""
+The rules, read by load_rules
+"""
+nolig = {}
+keeplig = []
+
+"""
+A PatternMatcher of all nolig patterns, finding the rules which may apply to
+a word in a single pass (cf. candidate_rules), the position of every nolig
+pattern in the order of nolig and, for every longest pattern matched by
+rule_matcher, the nolig rules among its prefixes (ordered as in nolig);
+set by load_rules (cf. index_noligs, which read_rules caches)
+"""
+rule_matcher = None
+nolig_positions = {}
+rule_prefixes = {} # pattern -> nolig rules
+
+"""
+A PatternMatcher of all keeplig patterns, finding the ones which may keep a
+ligature in a word in a single pass (cf. apply_rules); set by load_rules
+(cf. index_keepligs, which read_rules caches)
+"""
+keep_matcher = None
+
+"""
+Number of keeplig patterns containing a rule up to which apply_rules checks
+all of them instead of looking for the keeplig patterns in the word first
+(which only pays off for the rules contained in many keeplig patterns)
+"""
+MAX_KEEPLIG_CHECKS = 10
 
 
 """
@@ -63,16 +126,6 @@ stats_type2single = dict()
 stats_type2multiple = dict()
 
 
-"""
-Initialize the statistics (add all the rules with 'rule -> 0')
-"""
-for stat in [stats_good, stats_type2single, stats_type2multiple]:
-    for rule in nolig:
-        stat['|'.join(nolig[rule])] = 0
-    for rule in keeplig:
-        stat[rule] = 0
-
-
 """
 List of tuples with Dictionary and output file, makes it easier to process later
 """
@@ -81,6 +134,25 @@ stats = [(stats_good, out_stats_good),
          (stats_type2multiple, out_stats_type2multiple)]
 
 
+def load_rules(pattern_file=PATTERN_FILE):
+    """Reads the rules from the pattern file and initializes the statistics
+    (adds all the rules with 'rule -> 0').
+    Since read_rules collects the rules in global variables, it must be called
+    only once.
+    """
+    global nolig, keeplig, rule_matcher, nolig_positions, rule_prefixes, keep_matcher
+    (nolig, keeplig) = read_rules(pattern_file)
+    rule_matcher = patterns.nolig_matcher
+    rule_prefixes = patterns.nolig_prefixes
+    keep_matcher = patterns.keeplig_matcher
+    nolig_positions = dict([(rule, n) for (n, rule) in enumerate(nolig)])
+    for stat in [stats_good, stats_type2single, stats_type2multiple]:
+        for rule in nolig:
+            stat['|'.join(nolig[rule])] = 0
+        for rule in keeplig:
+            stat[rule] = 0
+
+
 def exists(f, xs):
     """PROBABLY NOT NEEDED ANYMORE !!
     The exists-function for lists, well-known from other functional languages 
@@ -91,67 +163,421 @@ def exists(f, xs):
     return reduce(or_function, map(f, xs))
 
 
+def candidate_rules(word):
+    """Returns the nolig rules (in the order of nolig) which may apply to the
+    word, i.e. which occur in it. All of them are found in a single pass by
+    rule_matcher.
+    Inserting bars into the word (cf. selnolig) can't make a rule without a
+    bar occur, so the rules occurring in the word while selnolig applies the
+    rules one after the other are among them."""
+    if rule_matcher is None: return nolig
+    found = rule_matcher.regex.findall(word) # the longest pattern per position
+    if not found: return () # most words
+    if len(found) == 1: return rule_prefixes[found[0]]
+    rules = set()
+    for key in set(found):
+        rules.update(rule_prefixes[key])
+    return sorted(rules, key=nolig_positions.get)
+
+
+def occurrences(rule, word):
+    """Returns the positions of the occurrences of the rule in the word which
+    word.replace(rule, ...) would replace (i.e. not overlapping ones)."""
+    positions = []
+    position = word.find(rule)
+    while position >= 0:
+        positions.append(position)
+        position = word.find(rule, position + max(len(rule), 1))
+    return positions
+
+
 def selnolig(word):
-    """Takes a word and simulates selnolig on it, i.e. applies all rules to it."""
+    """Takes a word and simulates selnolig on it, i.e. applies all rules to it
+    (only the ones which may apply at all, cf. candidate_rules)."""
+    rules = candidate_rules(word)
+    if not rules: return (word, [])
+    return apply_rules(word, rules, nolig, keepligs_containing, keep_matcher)
+
+
+def apply_rules(word, rules, noligs, keeps_containing, keep_matcher=None):
+    """Applies the given nolig rules one after the other to the word, with
+    their parts given by noligs and the keeplig patterns containing them
+    given by keeps_containing (cf. keepligs_containing).
+    An occurrence of a rule is kept if a keeplig pattern containing the rule
+    occurs in the word around this very occurrence; the other occurrences of
+    the rule are still replaced.
+    If a PatternMatcher of the keeplig patterns is given, only the ones it
+    finds in the word are checked: inserting bars can't make a keeplig
+    pattern without a bar occur (cf. index_keepligs)."""
     applied_rules = []
-    for rule in nolig:
+    occurring = None # the keeplig patterns in the word (found once needed)
+    for rule in rules:
         if rule in word:
-            applied = '|'.join(nolig[rule])
+            applied = '|'.join(noligs[rule])
             applied_rules.append(applied)
-            keep = False
-            for k in keepligs:
-                if k in word and rule in k:
+            keeps = keeps_containing.get(rule)
+            if not keeps:
+                word = word.replace(rule, applied)
+                continue
+            if keep_matcher is not None and len(keeps) > MAX_KEEPLIG_CHECKS:
+                if occurring is None:
+                    occurring = set([k for (position, k) in keep_matcher.find_all(word)])
+                keeps = [(k, offsets) for (k, offsets) in keeps if k in occurring]
+            positions = occurrences(rule, word)
+            kept = set()
+            for (k, offsets) in keeps:
+                covered = [position for position in positions for offset in offsets
+                           if position >= offset and word.startswith(k, position - offset)]
+                if covered:
                     applied_rules.append(k)
-                    keep = True
-            if not keep: 
+                    kept.update(covered)
+            if not kept:
                 word = word.replace(rule, applied)
+            elif len(kept) < len(positions):
+                parts = []
+                end = 0
+                for position in positions:
+                    if position not in kept:
+                        parts += [word[end:position], applied]
+                        end = position + len(rule)
+                word = ''.join(parts) + word[end:]
     return (word, applied_rules)
 
 
-def main():
+def analyze(record):
+    """Takes a MorphemeRecord, verifies whether selnolig yields the same results
+    on the word and updates the statistics about the rules and errors.
+    Returns the tuple (good, AnalysisRecord).
+    """
+    (selnolig_morphemes, applied_rules) = selnolig(record.word)
+    analysis = AnalysisRecord(record.word, record.morphemes,
+                              selnolig_morphemes, applied_rules)
+    if record.morphemes != selnolig_morphemes:
+        # write statistics
+        if len(applied_rules) == 1:
+            stats_type2single[applied_rules[0]] += 1
+        else:
+            for rule in applied_rules: # will catch len(applied_rules)==0 (and just do nothing)
+                stats_type2multiple[rule] += 1
+        return (False, analysis)
+    else:
+        # write statistics
+        for rule in applied_rules: stats_good[rule] += 1
+        return (True, analysis)
+
+
+def bad_analyses(records, out_good_file=None, out_bad_file=None):
+    """Takes MorphemeRecords and yields the AnalysisRecords of the words for
+    which selnolig yields different results (i.e. the input of
+    analyses_to_errors). The analyses are only written to the (opened) output
+    files if they are given."""
+    for record in records:
+        (good, analysis) = analyze(record)
+        write_analysis(good, analysis, out_good_file, out_bad_file)
+        if not good:
+            yield analysis
+
+
+def write_analysis(good, analysis, out_good_file=None, out_bad_file=None):
+    """Writes an AnalysisRecord to the (opened) output file for good or bad
+    words, if it is given."""
+    if not good:
+        # write output
+        if out_bad_file is not None:
+            out_bad_file.write(analysis_line(analysis) + '\n')
+    elif out_good_file is not None:
+        # write output
+        out_good_file.write(analysis.word + ' --- ' +
+                            ','.join(analysis.applied_rules) + '\n')
+
+
+def write_stats():
+    """Sorts and prints the statistics to the statistic files."""
+    for stat in stats:
+        rules = sorted(stat[0].iteritems(), key=operator.itemgetter(1), reverse=True)
+        stat_file = codecs.open(stat[1], 'wb', 'utf-8')
+        for rule in rules:
+            stat_file.write(rule[0] + ' : ' + unicode(rule[1]) + '\n')
+        stat_file.close()
+
+
+def chunks(in_file, indexed=False):
+    """Yields the chunks of CHUNK_WORDS lines of the input file for
+    analyze_chunk."""
+    start = 0
+    while True:
+        lines = list(islice(in_file, CHUNK_WORDS))
+        if not lines: return
+        yield (start, lines, indexed)
+        start += len(lines)
+
+
+def analyze_chunk(chunk):
+    """Analyzes a chunk of lines of the input file (chunk = (number of its
+    first line, lines, indexed)) in a worker process, which has inherited the
+    rules and the statistics (all 0) from the main process.
+    Returns the output for the good and the bad file, the counts of the chunk
+    for the statistics (only the rules applied) and the index of the chunk
+    (cf. index_word) if indexed is set, None otherwise."""
+    (start, lines, indexed) = chunk
+    (good_file, bad_file) = (StringIO(), StringIO())
+    chunk_index = None
+    if indexed: chunk_index = {'words': {}, 'multiple': {}, 'good': bytearray()}
+    for (n, line) in enumerate(lines, start):
+        record = read_morpheme_line(line)
+        (good, analysis) = analyze(record)
+        write_analysis(good, analysis, good_file, bad_file)
+        if indexed: index_word(chunk_index, n, record.word, good)
+    counts = []
+    for (stat, stat_file) in stats:
+        counts.append(dict([(rule, count) for (rule, count) in stat.iteritems()
+                            if count]))
+        for rule in counts[-1]: stat[rule] = 0 # for the next chunk
+    return (good_file.getvalue(), bad_file.getvalue(), counts, chunk_index)
+
+
+def merge_index(index, chunk_index):
+    """Adds the index of a chunk (cf. analyze_chunk) to the index."""
+    for (pattern, numbers) in chunk_index['words'].iteritems():
+        index['words'].setdefault(pattern, set()).update(numbers)
+    index['multiple'].update(chunk_index['multiple'])
+    index['good'] += chunk_index['good']
+
+
+def output_states():
+    """Returns the sizes and modification times of the output files."""
+    return [(os.path.getsize(f), os.path.getmtime(f)) for f in [out_good, out_bad]]
+
+
+def new_index(infile):
+    """Returns an empty index of the rules for the input file, i.e. a
+    dictionary containing:
+     - 'words': a dictionary of a pattern to the set of the (numbers of the)
+       words whose results it may change (cf. index_word)
+     - 'multiple': a dictionary of a word to its rules (in the order of nolig),
+       for the words containing several rules
+     - 'good': a bytearray, 1 for the good words and 0 for the bad ones
+    and the hash of the input file (cf. read_index)."""
+    return {'version': INDEX_VERSION, 'infile': file_hash(infile),
+            'words': {}, 'multiple': {}, 'good': bytearray()}
+
+
+def index_word(index, n, word, good):
+    """Adds the n-th word of the input file to the index, i.e. to the words
+    of the nolig rules occurring in it and of the keeplig patterns occurring
+    in it which contain one of these rules: the patterns whose changes may
+    change the result of selnolig for the word (cf. candidate_rules)."""
+    rules = list(candidate_rules(word))
+    keeps = set([k for rule in rules for (k, offsets) in keepligs_containing.get(rule, ())
+                 if k in word])
+    for pattern in rules + list(keeps):
+        index['words'].setdefault(pattern, set()).add(n)
+    if len(rules) > 1: # the order of the rules matters as well
+        index['multiple'][n] = rules
+    else:
+        index['multiple'].pop(n, None)
+    if n < len(index['good']):
+        index['good'][n] = good
+    else:
+        index['good'].append(good)
+
+
+def read_index(infile):
+    """Returns the index written by the last run (cf. write_index) if it
+    belongs to the current INDEX_VERSION, the input file has the same hash
+    and the output files have not been changed since, and None otherwise."""
+    try:
+        f = open(INDEX_FILE, 'rb')
+        try:
+            index = cPickle.load(f)
+        finally:
+            f.close()
+        if (not isinstance(index, dict) or index.get('version') != INDEX_VERSION
+            or index['outputs'] != output_states()):
+            return None
+    except Exception: # no index, an unreadable one or no output files
+        return None
+    if index['infile'] != file_hash(infile):
+        return None
+    return index
+
+
+def write_index(index):
+    """Writes the index together with the rules and the statistics it belongs
+    to and the states of the output files (cf. output_states)."""
+    index['nolig'] = nolig.items()
+    index['keeplig'] = keeplig
+    index['stats'] = [stat for (stat, stat_file) in stats]
+    index['outputs'] = output_states()
+    f = open(INDEX_FILE + '.tmp', 'wb')
+    cPickle.dump(index, f, cPickle.HIGHEST_PROTOCOL)
+    f.close()
+    if os.path.exists(INDEX_FILE):
+        os.remove(INDEX_FILE)
+    os.rename(INDEX_FILE + '.tmp', INDEX_FILE)
+
+
+def changed_patterns(index):
+    """Returns the set of the patterns (nolig rules and keeplig patterns)
+    which have been added, removed or changed since the index was written,
+    and the list of the added ones (whose words are not in the index).
+    If the order of the keeplig patterns has changed, all of them are
+    considered changed."""
+    old_nolig = dict(index['nolig'])
+    (old_keeps, keeps) = (Counter(index['keeplig']), Counter(keeplig))
+    changed = set([rule for rule in set(old_nolig) | set(nolig)
+                   if old_nolig.get(rule) != nolig.get(rule)])
+    changed_keeps = set([k for k in set(old_keeps) | set(keeps)
+                         if old_keeps[k] != keeps[k]])
+    if ([k for k in index['keeplig'] if k not in changed_keeps] !=
+        [k for k in keeplig if k not in changed_keeps]):
+        changed_keeps = set(old_keeps) | set(keeps)
+    changed.update(changed_keeps)
+    added = set([rule for rule in nolig if rule not in old_nolig] +
+                [k for k in keeps if k not in old_keeps])
+    return (changed, sorted(added))
+
+
+def remove_stats(good, line):
+    """Removes the result of a word from the statistics, given its line of the
+    good or bad output file (cf. analyze). Rules which have been removed from
+    the statistics are skipped."""
+    applied = line.decode('utf-8').rstrip('\n').split(ANALYSIS_SEPARATOR)[-1]
+    applied_rules = []
+    if applied: applied_rules = applied.split(',')
+    if good:
+        stat = stats_good
+    elif len(applied_rules) == 1:
+        stat = stats_type2single
+    else:
+        stat = stats_type2multiple
+    for rule in applied_rules:
+        if rule in stat: stat[rule] -= 1
+
+
+def update_analyses(infile, index):
+    """Analyzes only the words of the input file which are affected by the
+    changes of the rules since the index was written, i.e. the words
+    containing a changed pattern (cf. changed_patterns; the words containing
+    an added one are found by a PatternMatcher) and the words containing
+    several rules whose order has changed. The lines of the other words are
+    copied from the output files, and the statistics of the last run are
+    updated with the old and new results of the affected words.
+    The index is updated as well."""
+    (changed, added) = changed_patterns(index)
+    words = index['words']
+    affected = set()
+    for pattern in changed:
+        affected.update(words.get(pattern, ()))
+    for (n, rules) in index['multiple'].iteritems():
+        if sorted(rules, key=nolig_positions.get) != rules:
+            affected.add(n)
+    current = set(nolig) | set(keeplig)
+    for pattern in changed:
+        if pattern not in current: words.pop(pattern, None)
+    for ((stat, stat_file), old_stat) in zip(stats, index['stats']):
+        for rule in stat:
+            stat[rule] = old_stat.get(rule, 0)
+
+    in_file = codecs.open(infile, 'r', 'utf-8')
+    lines = in_file.read().splitlines(True) # the lines as main reads them
+    in_file.close()
+    if added:
+        added_matcher = PatternMatcher(added)
+        affected.update([n for (n, line) in enumerate(lines)
+                         if added_matcher.contains_any(line)])
+    old_lines = [] # of the bad and the good words (s.t. good is the index)
+    for f in [out_bad, out_good]:
+        old_file = open(f, 'rb')
+        old_lines.append(old_file.read().splitlines(True))
+        old_file.close()
+    out_files = [codecs.open(out_bad + '.tmp', 'wb', 'utf-8'),
+                 codecs.open(out_good + '.tmp', 'wb', 'utf-8')]
+    copied = [0, 0] # number of the old lines copied (or replaced) so far
+    end = 0 # number of the words done so far
+    for n in sorted(affected) + [len(lines)]:
+        # copy the lines of the words in between
+        good_words = index['good'].count('\x01', end, n)
+        for (good, count) in [(0, n - end - good_words), (1, good_words)]:
+            out_files[good].stream.writelines(
+                old_lines[good][copied[good]:copied[good] + count])
+            copied[good] += count
+        if n == len(lines): break
+        good = index['good'][n]
+        remove_stats(good, old_lines[good][copied[good]])
+        copied[good] += 1
+        record = read_morpheme_line(lines[n])
+        (good, analysis) = analyze(record)
+        write_analysis(good, analysis, out_files[1], out_files[0])
+        index_word(index, n, record.word, good)
+        end = n + 1
+    for f in out_files:
+        f.close()
+    for f in [out_good, out_bad]:
+        os.remove(f)
+        os.rename(f + '.tmp', f)
+    print 'Analyzed', len(affected), 'of', len(lines), 'words again (' + \
+          str(len(changed)), 'changed patterns)'
+
+
+def main(infile=INFILE, pattern_file=PATTERN_FILE, incremental=INCREMENTAL,
+         processes=PROCESSES):
     """Reads the lines from morphdict (morphemes.good), verifies whether selnolig
     yields the same results on this word and writes the word to the dedicated
     file (output_good or output_bad).
     At the same time it maintains some statistics about the rules and errors.
+    If incremental is set and the index of the last run is up to date (cf.
+    read_index), only the words affected by the changes of the rules are
+    analyzed again (cf. update_analyses).
+    Otherwise the words are analyzed in several processes if processes > 1:
+    the outputs of the chunks are written and their statistics are added up
+    in the order of the chunks, so the results are the same.
     """
-    global stats, stats_good, stats_type2single, stats_type2multiple
-    
     start = time()
-    
-    for line in morph_dict:
-        line = line.rstrip()
-        morpheme_split = re.split(' -> ', line)
-        (word, morphemes) = (morpheme_split[0], morpheme_split[1])
-        (selnolig_morphemes, applied_rules) = selnolig(word)
-        if morphemes != selnolig_morphemes:
-            # write statistics
-            if len(applied_rules) == 1:
-                stats_type2single[applied_rules[0]] += 1
-            else:
-                for rule in applied_rules: # will catch len(applied_rules)==0 (and just do nothing)
-                    stats_type2multiple[rule] += 1
-            # write output
-            out_bad.write(word + ' --- ' + morphemes +
-                                 ' --- ' + selnolig_morphemes +
-                                 ' --- ' + ','.join(applied_rules) + '\n')
-        else:
-            # write statistics
-            for rule in applied_rules: stats_good[rule] += 1
-            # write output
-            out_good.write(word + ' --- ' + ','.join(applied_rules) + '\n')
+    load_rules(pattern_file)
+    if rule_matcher is None: incremental = False # (cf. load_rules)
 
-    morph_dict.close()
-    out_good.close()
-    out_bad.close()
+    index = None
+    if incremental: index = read_index(infile)
+    if index is not None:
+        update_analyses(infile, index)
+    else:
+        if incremental: index = new_index(infile)
+        morph_dict = codecs.open(infile, 'r', 'utf-8')
+        out_good_file = codecs.open(out_good, 'wb', 'utf-8')
+        out_bad_file = codecs.open(out_bad, 'wb', 'utf-8')
+        if processes > 1:
+            pool = Pool(processes)
+            results = pool.imap(analyze_chunk, chunks(morph_dict, index is not None))
+            for (good_lines, bad_lines, counts, chunk_index) in results:
+                out_good_file.write(good_lines)
+                out_bad_file.write(bad_lines)
+                for ((stat, stat_file), chunk_stat) in zip(stats, counts):
+                    for (rule, count) in chunk_stat.iteritems():
+                        stat[rule] += count
+                if index is not None: merge_index(index, chunk_index)
+            pool.close()
+            pool.join()
+            print 'Used', processes, 'processes'
+        else:
+            for (n, line) in enumerate(morph_dict):
+                record = read_morpheme_line(line)
+                (good, analysis) = analyze(record)
+                write_analysis(good, analysis, out_good_file, out_bad_file)
+                if index is not None: index_word(index, n, record.word, good)
+        morph_dict.close()
+        out_good_file.close()
+        out_bad_file.close()
 
     # sort and print statistics
-    for stat in stats:
-        rules = sorted(stat[0].iteritems(), key=operator.itemgetter(1), reverse=True)
-        for rule in rules:
-            stat[1].write(rule[0] + ' : ' + unicode(rule[1]) + '\n')
-        stat[1].close()
+    write_stats()
+    if index is not None:
+        write_index(index)
+    elif os.path.exists(INDEX_FILE):
+        os.remove(INDEX_FILE)
     
     print 'Runtime: ' + str(time()-start) + 's' 
 
 
-main()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+This module serves to compare the consistency check of the selnolig patterns
+(morphemes_to_analyses__read_selnolig_patterns.check_rules) with the original
+one (comparing every pattern with every other one): it checks that both report
+the same conflicts in the same order, for the pattern file and for random
+patterns, and measures their runtime.
+It also compares reading the pattern file with and without its cache
+(cf. read_rules), and selnolig with a plain one (applying every rule and
+checking every keeplig pattern on every word) on the words of morphemes.good
+and on random words built up of parts of the rules, measuring their
+throughput. The words for which the original selnolig (where a keeplig pattern
+anywhere in the word keeps every occurrence of a rule) differs are counted.
+
+Version: 0.1
+
+
+Copyright (c) 2012-2013, Steffen Hildebrandt and Felix Lehmann
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+This software is provided by the copyright holders and contributors "as is" and
+any express or implied warranties, including, but not limited to, the implied
+warranties of merchantability and fitness for a particular purpose are
+disclaimed. In no event shall the copyright owner or contributors be liable for
+any direct, indirect, incidental, special, exemplary, or consequential damages
+(including, but not limited to, procurement of substitute goods or services;
+loss of use, data, or profits; or business interruption) however caused and
+on any theory of liability, whether in contract, strict liability, or tort
+(including negligence or otherwise) arising in any way out of the use of this
+software, even if advised of the possibility of such damage.
+"""
+
+import os
+import sys
+import random
+from StringIO import StringIO
+from itertools import islice
+from morphemes_to_analyses import *
+import morphemes_to_analyses as analyses
+import morphemes_to_analyses__read_selnolig_patterns as patterns
+
+"""
+Number of random nolig and keeplig patterns compared with the original check,
+and number of random nolig patterns for which only the new check is timed
+"""
+RANDOM_RULES = 2000
+MANY_RANDOM_RULES = 100000
+
+"""
+Maximal number of words read from the input file / number of random words
+"""
+MAX_WORDS = 1000000
+RANDOM_WORDS = 100000
+
+
+def exists(f, xs):
+    """The exists-function for lists, well-known from other functional languages 
+    exists takes a predicate (function) and a list
+    and returns true, if the predicate fits on one or more elements of the list.
+    """
+    def or_function(a,b): return a or b
+    return reduce(or_function, map(f, xs))
+
+
+def findInBetween(p1, p2, ligs):
+    """Takes a set of rules (ligs) and two keys p1 and p2
+    and looks for a rule in ligs 'in between' p1 and p2,
+    i.e. a rule with key k, s.t. (p1 < k < p2) or (p2 < k < p1)
+    ('<' meaning 'is contained in')
+    """
+    if p1 in p2:
+        return exists(lambda k: p1 in k and k in p2, ligs)
+    elif p2 in p1:
+        return exists(lambda k: p2 in k and k in p1, ligs)
+    else:
+        raise Exception('Invalid arguments!')
+
+
+def check_rules_reference():
+    """The original check_rules."""
+    noligs = patterns.noligs
+    keepligs = patterns.keepligs
+    def conflicting_rules(a, b):
+        print ('!!!!! CONFLICTING RULES DETECTED !!!!!   ----->  ' +
+               a + ' contains ' + b)
+    for rule in noligs:
+        nol = noligs[rule]
+        if rule != ''.join(nol):
+            print ('!!!!!   INVALID   RULE  DETECTED !!!!!   ----->  ' +
+                   rule + ' <--> ' + '[' + ', '.join(nol) + ']')
+        for n in range(0,len(nol)-1):
+            if not (nol[n][-1] + nol[n+1][0] in [lig.glyph for lig in LIGS]):
+                print nol[n][-1] + nol[n+1][0]
+                print ('!!!!!   INVALID   RULE  DETECTED !!!!!   ----->  ' +
+                   rule + ' <--> ' + '[' + ', '.join(nol) + ']')
+        for rule1 in noligs:
+            if ((rule1 in rule) and (rule1 != rule) and
+                not findInBetween(rule, rule1, keepligs)):
+                conflicting_rules(rule, rule1)
+    for rule in keepligs:
+        for rule1 in keepligs:
+            if ((rule1 in rule) and (rule1 != rule) and
+                not findInBetween(rule, rule1, noligs)):
+                conflicting_rules(rule, rule1)
+
+
+def selnolig_reference(word):
+    """selnolig checking every rule and every keeplig pattern containing it
+    (at every position of the rule in the keeplig pattern)."""
+    applied_rules = []
+    for rule in analyses.nolig:
+        if rule in word:
+            applied = '|'.join(analyses.nolig[rule])
+            applied_rules.append(applied)
+            positions = [n for n in range(len(word)) if word[n:].startswith(rule)]
+            replaced = []
+            for position in positions: # as replaced by word.replace
+                if not replaced or position >= replaced[-1] + len(rule):
+                    replaced.append(position)
+            kept = set()
+            for k in analyses.keeplig:
+                offsets = [n for n in range(len(k)) if k[n:].startswith(rule)]
+                covered = [position for position in replaced for offset in offsets
+                           if position >= offset
+                           and word[position - offset:][:len(k)] == k]
+                if covered:
+                    applied_rules.append(k)
+                    kept.update(covered)
+            new_word = word[:replaced[0]]
+            for (n, position) in enumerate(replaced):
+                if position in kept: new_word += rule
+                else: new_word += applied
+                if n + 1 < len(replaced):
+                    new_word += word[position + len(rule):replaced[n + 1]]
+            word = new_word + word[replaced[-1] + len(rule):]
+    return (word, applied_rules)
+
+
+def selnolig_original(word):
+    """The original selnolig."""
+    applied_rules = []
+    for rule in analyses.nolig:
+        if rule in word:
+            applied = '|'.join(analyses.nolig[rule])
+            applied_rules.append(applied)
+            keep = False
+            for k in analyses.keeplig:
+                if k in word and rule in k:
+                    applied_rules.append(k)
+                    keep = True
+            if not keep: 
+                word = word.replace(rule, applied)
+    return (word, applied_rules)
+
+
+def read_words(infile):
+    """Returns the words of the input file (an empty list if there is none)."""
+    try:
+        in_file = codecs.open(infile, 'r', 'utf-8')
+    except IOError:
+        return []
+    words = [read_morpheme_line(line).word for line in islice(in_file, MAX_WORDS)]
+    in_file.close()
+    return words
+
+
+def random_word():
+    """Returns a random word built up of parts of the rules and random letters."""
+    parts = []
+    for n in range(random.randint(1, 5)):
+        if random.random() < 0.7:
+            part = random.choice(random.choice([analyses.nolig.keys(),
+                                                analyses.keeplig]))
+            start = random.randint(0, len(part) / 2)
+            parts.append(part[start:random.randint(start + 1, len(part))])
+        else:
+            parts.append(random.choice(u'aefhiklnorstu'))
+    return u''.join(parts)
+
+
+def compare_selnolig(words):
+    """Checks that selnolig and selnolig_reference give the same results for
+    all words and prints the runtimes of selnolig and the original one."""
+    differences = 0
+    changes = 0
+    for word in words:
+        result = selnolig(word)
+        if result != selnolig_reference(word):
+            differences += 1
+            if differences <= 10:
+                print ('DIFFERENT: ' + word).encode('utf-8')
+        if result != selnolig_original(word):
+            changes += 1
+    if differences == 0:
+        print 'selnolig: identical -- success!'
+    else:
+        print 'selnolig: different for', differences, 'words -- uh-oh.'
+    print 'Words with other results than the original selnolig:', changes
+    runtimes = []
+    for function in [selnolig_original, selnolig]:
+        start = time()
+        for word in words:
+            function(word)
+        runtimes.append(time() - start)
+    print 'Original selnolig: ' + str(runtimes[0]) + 's (' + \
+          str(runtimes[0] / max(len(words), 1) * 1e6) + ' us per word)'
+    print 'selnolig:          ' + str(runtimes[1]) + 's (' + \
+          str(runtimes[1] / max(len(words), 1) * 1e6) + ' us per word)'
+    print 'Speedup:           ' + str(runtimes[0] / max(runtimes[1], 1e-9))
+
+
+def random_part(length):
+    """Returns a random string of the given length (of few letters, s.t. the
+    patterns often contain each other)."""
+    return u''.join([random.choice(u'aeifhklnorstu') for n in range(length)])
+
+
+def set_random_rules(number, length=0):
+    """Replaces the rules by the given number of random nolig patterns (and a
+    tenth as many keeplig patterns, some of them twice), with at least the
+    given number of letters before and after the ligature."""
+    patterns.noligs.clear()
+    del patterns.keepligs[:]
+    for n in range(number):
+        glyph = random.choice(LIGS).glyph
+        split = random.randint(1, len(glyph) - 1)
+        before = random_part(random.randint(length, 4)) + glyph[:split]
+        after = glyph[split:] + random_part(random.randint(length, 4))
+        patterns.noligs[before + after] = [before, after]
+    rules = patterns.noligs.keys()
+    for n in range(number / 10):
+        keeplig = random_part(random.randint(0, 2)) + random.choice(rules) + \
+                  random_part(random.randint(0, 2))
+        patterns.keepligs.append(keeplig)
+        if random.random() < 0.1: patterns.keepligs.append(keeplig)
+
+
+def run(function):
+    """Returns the output and the runtime of the function."""
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    start = time()
+    function()
+    runtime = time() - start
+    output = sys.stdout.getvalue()
+    sys.stdout = stdout
+    return (output, runtime)
+
+
+def compare(name):
+    """Compares check_rules with the original one for the current rules."""
+    (output, runtime) = run(check_rules)
+    (reference, reference_runtime) = run(check_rules_reference)
+    print name + ':', len(patterns.noligs), 'nolig patterns,', \
+          len(patterns.keepligs), 'keeplig patterns,', \
+          output.count('\n'), 'lines of output'
+    if output == reference:
+        print 'Output: identical -- success!'
+    else:
+        print 'Output: different -- uh-oh.'
+    print 'Original check_rules: ' + str(reference_runtime) + 's'
+    print 'check_rules:          ' + str(runtime) + 's'
+    print 'Speedup:              ' + str(reference_runtime / max(runtime, 1e-9))
+
+
+def reset_rules():
+    """Removes the rules read before (read_rules collects them in global
+    variables)."""
+    patterns.noligs.clear()
+    patterns.nolig_patterns.clear()
+    patterns.keepligs_containing.clear()
+    for rules in [patterns.keepligs, patterns.messages]:
+        del rules[:]
+
+
+def read_rules_from(pattern_file, cache):
+    """Reads the rules from scratch (with or without the cache) and returns
+    them (noligs in their order, keepligs and messages), their indexes and the
+    runtime."""
+    reset_rules()
+    (output, runtime) = run(lambda: read_rules(pattern_file, cache))
+    matcher = patterns.nolig_matcher
+    if matcher is not None:
+        matcher = (matcher.regex.pattern, matcher.prefixes,
+                   matcher.regex.findall(u' '.join(patterns.keepligs)))
+    keep_matcher = patterns.keeplig_matcher
+    if keep_matcher is not None:
+        keep_matcher = (keep_matcher.regex.pattern, keep_matcher.prefixes)
+    return ((patterns.noligs.items(), list(patterns.keepligs),
+             list(patterns.messages), dict(patterns.keepligs_containing),
+             matcher, dict(patterns.nolig_prefixes), keep_matcher), runtime)
+
+
+def main(pattern_file=PATTERN_FILE, infile=INFILE):
+    random.seed(0)
+    (rules, runtime) = read_rules_from(pattern_file, False)
+    if os.path.exists(pattern_file + CACHE_SUFFIX):
+        os.remove(pattern_file + CACHE_SUFFIX)
+    (cache_rules, cache_runtime) = read_rules_from(pattern_file, True)
+    print 'read_rules without cache: ' + str(runtime) + 's'
+    print 'read_rules writing cache: ' + str(cache_runtime) + 's'
+    (cache_rules, cache_runtime) = read_rules_from(pattern_file, True)
+    print 'read_rules reading cache: ' + str(cache_runtime) + 's'
+    if rules == cache_rules:
+        print 'Cached rules: identical -- success!'
+    else:
+        print 'Cached rules: different -- uh-oh.'
+    compare(pattern_file)
+
+    set_random_rules(RANDOM_RULES)
+    compare('Random patterns')
+
+    set_random_rules(MANY_RANDOM_RULES, 2)
+    (output, runtime) = run(check_rules)
+    print 'check_rules for', len(patterns.noligs), 'nolig patterns and', \
+          len(patterns.keepligs), 'keeplig patterns (' + \
+          str(output.count('\n')) + ' lines of output): ' + str(runtime) + 's'
+
+    reset_rules()
+    run(lambda: load_rules(pattern_file))
+    words = read_words(infile)
+    print 'Words:', len(words), '+', RANDOM_WORDS, 'random words,', \
+          len(analyses.nolig), 'nolig patterns,', \
+          len(analyses.keeplig), 'keeplig patterns'
+    words += [random_word() for n in xrange(RANDOM_WORDS)]
+    compare_selnolig(words)
+
+
+if __name__ == '__main__':
+    main()
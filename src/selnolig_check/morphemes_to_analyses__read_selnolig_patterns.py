@@ -31,37 +31,160 @@ on any theory of liability, whether in contract, strict liability, or tort
 software, even if advised of the possibility of such damage.
 """
 
+import os
 import codecs
+import hashlib
+import cPickle
+from collections import OrderedDict
 from Ligatures import *
 
+"""
+Whether the rules read from a pattern file should be cached (in the file
+pattern file + CACHE_SUFFIX), s.t. the pattern file is only parsed and
+checked again if its contents have changed (cf. read_rules)
+"""
+CACHE = True
+CACHE_SUFFIX = '.cache'
+
+"""
+Version of the cache, which has to be increased whenever the rules are read
+differently (or the cached data changes), s.t. old caches are not used anymore
+"""
+CACHE_VERSION = 5
+
 """
 The list of rules which will be filled and returned by read_rules
 """
 noligs = {}  # pattern -> list of parts
 keepligs = []
 
+"""
+The nolig patterns in the order in which they were first read (cf. order_noligs)
+"""
+nolig_patterns = OrderedDict() # pattern -> list of parts
+
+"""
+The keeplig patterns containing each nolig pattern (cf. index_keepligs)
+"""
+keepligs_containing = {} # pattern -> list of (keeplig pattern, positions of the pattern in it)
+
+"""
+A PatternMatcher of all keeplig patterns (None if there is a pattern which is
+empty or contains a bar, cf. index_keepligs)
+"""
+keeplig_matcher = None
+
+"""
+A PatternMatcher of all nolig patterns (None if there is a pattern which is
+empty or contains a bar) and, for every key of it, the nolig patterns among
+its prefixes in the order of noligs (cf. index_noligs)
+"""
+nolig_matcher = None
+nolig_prefixes = {} # pattern -> nolig patterns
+
+"""
+The messages about invalid or conflicting rules (cf. report)
+"""
+messages = []
 
-def read_rules(nolig_file):
+
+def read_rules(nolig_file, cache=CACHE):
     """The main function
     Takes a nolig file (e.g. 'selnolig-german-patterns.sty') and returns
     a tuple containing:
      - a dictionary of a pattern to a list of parts
      - a list of keeplig patterns
-    It also checks the rules for consistency (see check_rules)
+    It also checks the rules for consistency (see check_rules) and fills
+    keepligs_containing and keeplig_matcher (see index_keepligs), nolig_matcher
+    and nolig_prefixes (see index_noligs)
+    If cache is set, the rules, the messages about them and these indexes are
+    taken from the cache of the file if it is up to date (i.e. if the sha1
+    hash of the file is the same, cf. CACHE), and the cache is written
+    otherwise.
     """
-    global noligs, keepligs
-    in_file = codecs.open(nolig_file, 'r', 'utf-8')
-    
-    for line in in_file:
-        process_line(line)
-    in_file.close()
-    
-    check_rules()
+    global noligs, keepligs, keeplig_matcher, nolig_matcher, nolig_prefixes
+    cache_file = nolig_file + CACHE_SUFFIX
+    digest = file_hash(nolig_file)
+    cached = None
+    if cache: cached = read_cache(cache_file, digest)
+    if cached is not None:
+        for (k, parts) in cached['noligs']:
+            add_nolig(k, parts)
+        order_noligs()
+        keepligs += cached['keepligs']
+        for message in cached['messages']:
+            report(message)
+        keepligs_containing.clear()
+        keepligs_containing.update(cached['keepligs_containing'])
+        keeplig_matcher = cached['keeplig_matcher']
+        (nolig_matcher, nolig_prefixes) = cached['nolig_matcher']
+    else:
+        in_file = codecs.open(nolig_file, 'r', 'utf-8')
+
+        for line in in_file:
+            process_line(line)
+        in_file.close()
+
+        order_noligs()
+        check_rules()
+        index_keepligs()
+        index_noligs()
+        if cache: write_cache(cache_file, digest)
     print 'Number of nolig patterns:', len(noligs)
     print 'Number of keeplig patterns:', len(keepligs)
     return (noligs, keepligs)
 
 
+def report(message):
+    """Prints a message about the rules and keeps it for the cache."""
+    print message
+    messages.append(message)
+
+
+def file_hash(path):
+    """Returns the sha1 hash of the contents of the file."""
+    sha1 = hashlib.sha1()
+    f = open(path, 'rb')
+    for block in iter(lambda: f.read(1 << 20), ''):
+        sha1.update(block)
+    f.close()
+    return sha1.hexdigest()
+
+
+def read_cache(cache_file, digest):
+    """Returns the cached data (a dictionary, cf. write_cache) if the cache
+    file exists and belongs to the file with the given hash and to the current
+    CACHE_VERSION, and None otherwise."""
+    try:
+        f = open(cache_file, 'rb')
+        try:
+            cached = cPickle.load(f)
+        finally:
+            f.close()
+    except Exception: # no cache or an unreadable one
+        return None
+    if (not isinstance(cached, dict) or cached.get('version') != CACHE_VERSION
+        or cached.get('hash') != digest):
+        return None
+    return cached
+
+
+def write_cache(cache_file, digest):
+    """Writes the rules, the messages about them and the indexes of the rules
+    to the cache file, together with the hash of the pattern file and the
+    CACHE_VERSION."""
+    cached = {'version': CACHE_VERSION, 'hash': digest,
+              'noligs': nolig_patterns.items(),
+              'keepligs': keepligs, 'messages': messages,
+              'keepligs_containing': keepligs_containing,
+              'keeplig_matcher': keeplig_matcher,
+              'nolig_matcher': (nolig_matcher, nolig_prefixes)}
+    f = open(cache_file + '.tmp', 'wb')
+    cPickle.dump(cached, f, cPickle.HIGHEST_PROTOCOL)
+    f.close()
+    os.rename(cache_file + '.tmp', cache_file) # replace the cache at once
+
+
 def process_line(line):
     """Processes a line, i.e. ignores comments (%) and looks for \nolig commands."""
     n = 0
@@ -100,7 +223,20 @@ def process_line(line):
 
 def process_nolig_pattern(k, v):
     """Takes a pattern (key value pair), processes it and inserts it into the noligs
-    dictionary.
+    dictionary (cf. nolig_rules).
+    """
+    rules = nolig_rules(k, v)
+    if rules is None:
+        report('!!!!!  NOLIG RULE WITHOUT A BAR  !!!!!   ----->  ' + k)
+        return #raise Exception('Invalid nolig pattern: ' + k + ' , ' + v)
+    for (key, parts) in rules:
+        add_nolig(key, parts)
+    return
+
+
+def nolig_rules(k, v):
+    """Takes a pattern (key value pair) and returns the list of the tuples
+    (pattern, list of parts) it stands for, or None if the value contains no bar.
     Since the syntax, especially regarding the regex part, is not yet completely specified,
     we're making some assumptions:
      - There's at most one regex component (i.e. at most one pair of brackets)
@@ -109,12 +245,10 @@ def process_nolig_pattern(k, v):
          * the regex component is in the second morpheme and occurs only in the first argument
     Consequence: We basically just 
     """
-    global noligs
     keys = read_regex(k)
     bar_pos = v.find(u'|')
     if bar_pos < 0:
-        print ('!!!!!  NOLIG RULE WITHOUT A BAR  !!!!!   ----->  ' + k)
-        return #raise Exception('Invalid nolig pattern: ' + k + ' , ' + v)
+        return None
     if keys[0][:bar_pos] != v[:bar_pos]:
         raise Exception('Non-matching pattern: ' + k + ' , ' + v)
     
@@ -135,12 +269,27 @@ def process_nolig_pattern(k, v):
                 n += 1      
                 
             value.append(current)
-            noligs.update({k:value})
+            return [(k, value)]
     else: # only one bar 
-        for k in keys:
-            noligs.update({ k : [k[:bar_pos], 
-                                 k[bar_pos:]]  })
-    return
+        return [(k, [k[:bar_pos], k[bar_pos:]]) for k in keys]
+
+
+def add_nolig(k, parts):
+    """Inserts a nolig pattern into nolig_patterns (cf. order_noligs)."""
+    nolig_patterns[k] = parts
+
+
+def order_noligs():
+    """Fills the noligs dictionary with the patterns of nolig_patterns.
+    selnolig applies the rules in the order in which noligs is iterated, which
+    depends on the order in which the patterns were inserted into it. So they
+    are inserted in the order in which they were first read (the same order as
+    when inserting every pattern while reading it), which the cache keeps as
+    well, and which also gives the order with further patterns read after them
+    (cf. morphemes_to_analyses__what_if.nolig_order)."""
+    noligs.clear()
+    for (k, parts) in nolig_patterns.items():
+        noligs.update({k : parts})
 
 
 def process_keeplig_pattern(k):
@@ -165,7 +314,7 @@ def read_regex(pattern):
     for char in pattern:
         if char == '[':
             if bracketsSeen: 
-                raise Exception('Can\'t handle more than one pair of brackets in one pattern: ' + k)
+                raise Exception('Can\'t handle more than one pair of brackets in one pattern: ' + pattern)
             else:
                 inBrackets = bracketsSeen = True
                 basisWord = words[0]
@@ -182,57 +331,100 @@ def read_regex(pattern):
     return words
 
 
-def exists(f, xs):
-    """The exists-function for lists, well-known from other functional languages 
-    exists takes a predicate (function) and a list
-    and returns true, if the predicate fits on one or more elements of the list.
+def index_keepligs():
+    """Fills keepligs_containing, which maps every nolig pattern to the
+    keeplig patterns containing it (in the order of keepligs), each together
+    with the positions of the nolig pattern in it. So selnolig needs to check
+    only these keeplig patterns, and only at the positions of the word where
+    they would cover the nolig pattern.
+    It also sets keeplig_matcher to a PatternMatcher of all keeplig patterns,
+    which finds the ones occurring in a word in a single pass, s.t. selnolig
+    needn't check the others at all.
     """
-    def or_function(a,b): return a or b
-    return reduce(or_function, map(f, xs))
+    global keeplig_matcher
+    keeplig_matcher = None
+    if keepligs and not [k for k in keepligs if '|' in k or not k]:
+        keeplig_matcher = PatternMatcher(keepligs)
+    keepligs_containing.clear()
+    nolig_index = SubstringIndex(noligs)
+    for k in keepligs:
+        positions = {} # nolig pattern -> positions in k
+        for (position, rule) in nolig_index.find_all(k):
+            positions.setdefault(rule, []).append(position)
+        for rule in positions:
+            keepligs_containing.setdefault(rule, []).append((k, positions[rule]))
 
 
-def findInBetween(p1, p2, ligs):
-    """Takes a set of rules (ligs) and two keys p1 and p2
-    and looks for a rule in ligs 'in between' p1 and p2,
-    i.e. a rule with key k, s.t. (p1 < k < p2) or (p2 < k < p1)
-    ('<' meaning 'is contained in')
+def index_noligs():
+    """Sets nolig_matcher to a PatternMatcher of all nolig patterns, which
+    finds the patterns occurring in a word in a single pass, and fills
+    nolig_prefixes with the nolig patterns among the prefixes of each of its
+    keys, ordered as in noligs (in which selnolig applies them).
+    Since compiling the matcher takes a while for many patterns, both are kept
+    in the cache (cf. PatternMatcher.__getstate__).
     """
-    if p1 in p2:
-        return exists(lambda k: p1 in k and k in p2, ligs)
-    elif p2 in p1:
-        return exists(lambda k: p2 in k and k in p1, ligs)
-    else:
-        raise Exception('Invalid arguments!')
+    global nolig_matcher, nolig_prefixes
+    nolig_matcher = None
+    nolig_prefixes = {}
+    if [rule for rule in noligs if '|' in rule or not rule]:
+        return # (a rule containing a bar may occur only after another one was applied)
+    nolig_matcher = PatternMatcher(noligs.keys())
+    positions = dict([(rule, n) for (n, rule) in enumerate(noligs)])
+    for (key, prefixes) in nolig_matcher.prefixes.items():
+        nolig_prefixes[key] = sorted(set(prefixes), key=positions.get)
+
+
+def contained_patterns(index, word):
+    """Returns the set of all patterns of the index (cf. SubstringIndex)
+    contained in the word."""
+    return set([pattern for (position, pattern) in index.find_all(word)])
 
 
 def check_rules():
     """Checks all the rules in noligs for consistency, i.e.
      - checks for typos (key - value don't match)
      - checks for conflicting rules (patterns containing each other)
+    Two patterns do not conflict if there is a rule of the other kind 'in
+    between' them, i.e. a keeplig (nolig) pattern k with rule1 < k < rule
+    ('<' meaning 'is contained in', '=' included).
+    Instead of comparing every pattern with every other one, the patterns
+    contained in a pattern are looked up in a SubstringIndex of all patterns;
+    the conflicts are reported in the same order as before.
     """
     global noligs
     def conflicting_rules(a, b):
-        print ('!!!!! CONFLICTING RULES DETECTED !!!!!   ----->  ' +
+        report('!!!!! CONFLICTING RULES DETECTED !!!!!   ----->  ' +
                a + ' contains ' + b)
+    glyphs = set([lig.glyph for lig in LIGS])
+    nolig_index = SubstringIndex(noligs)
+    keeplig_index = SubstringIndex(keepligs)
+    nolig_order = dict([(rule, n) for (n, rule) in enumerate(noligs)])
+    keeplig_positions = {} # keeplig pattern -> its positions in keepligs
+    for (n, rule) in enumerate(keepligs):
+        keeplig_positions.setdefault(rule, []).append(n)
+
     for rule in noligs:
         nol = noligs[rule]
         if rule != ''.join(nol):
-            print ('!!!!!   INVALID   RULE  DETECTED !!!!!   ----->  ' +
+            report('!!!!!   INVALID   RULE  DETECTED !!!!!   ----->  ' +
                    rule + ' <--> ' + '[' + ', '.join(nol) + ']')
         for n in range(0,len(nol)-1):
-            if not (nol[n][-1] + nol[n+1][0] in [lig.glyph for lig in LIGS]):
-                print nol[n][-1] + nol[n+1][0]
-                print ('!!!!!   INVALID   RULE  DETECTED !!!!!   ----->  ' +
+            if not (nol[n][-1] + nol[n+1][0] in glyphs):
+                report(nol[n][-1] + nol[n+1][0])
+                report('!!!!!   INVALID   RULE  DETECTED !!!!!   ----->  ' +
                    rule + ' <--> ' + '[' + ', '.join(nol) + ']')
-        for rule1 in noligs:
-            if ((rule1 in rule) and (rule1 != rule) and
-                not findInBetween(rule, rule1, keepligs)):
+        in_between = contained_patterns(keeplig_index, rule)
+        for rule1 in sorted(contained_patterns(nolig_index, rule),
+                            key=nolig_order.get):
+            if rule1 != rule and not [k for k in in_between if rule1 in k]:
                 conflicting_rules(rule, rule1)
     for rule in keepligs:
-        for rule1 in keepligs:
-            if ((rule1 in rule) and (rule1 != rule) and
-                not findInBetween(rule, rule1, noligs)):
-                conflicting_rules(rule, rule1)
+        in_between = contained_patterns(nolig_index, rule)
+        conflicts = [n for rule1 in contained_patterns(keeplig_index, rule)
+                     if rule1 != rule and not [k for k in in_between if rule1 in k]
+                     for n in keeplig_positions[rule1]]
+        for n in sorted(conflicts):
+            conflicting_rules(rule, keepligs[n])
         
 
 
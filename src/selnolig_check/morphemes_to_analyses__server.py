@@ -0,0 +1,235 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+This module runs selnolig_check as a server: the rules are read once (and,
+if MORPHEMES is set, the words of morphemes.good as well, cf.
+morphemes_to_analyses__what_if.load) and kept in memory, and the words are
+sent by HTTP requests to localhost, so no request pays for starting Python
+and reading the rules.
+
+Requests (POST, JSON objects, several words per request):
+ - /apply    {"words": [...]}
+   the results of selnolig for the words: the word with a bar at each
+   suppressed ligature and the applied rules
+ - /analyze  {"words": [...]}
+   the same, together with the morphemes of the words according to smor
+   (null for unknown words) and whether selnolig agrees with them
+ - /what_if  {"patterns": ["\\nolig{...}{...}", "\\keeplig{...}", ...]}
+   the numbers of words each candidate pattern would fix, break or leave
+   unchanged, with examples (cf. morphemes_to_analyses__what_if)
+GET / returns the numbers of the rules and words.
+
+Version: 0.1
+
+
+Copyright (c) 2012-2013, Steffen Hildebrandt and Felix Lehmann
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+This software is provided by the copyright holders and contributors "as is" and
+any express or implied warranties, including, but not limited to, the implied
+warranties of merchantability and fitness for a particular purpose are
+disclaimed. In no event shall the copyright owner or contributors be liable for
+any direct, indirect, incidental, special, exemplary, or consequential damages
+(including, but not limited to, procurement of substitute goods or services;
+loss of use, data, or profits; or business interruption) however caused and
+on any theory of liability, whether in contract, strict liability, or tort
+(including negligence or otherwise) arising in any way out of the use of this
+software, even if advised of the possibility of such damage.
+"""
+
+import sys
+import json
+import traceback
+from time import time
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from morphemes_to_analyses import *
+import morphemes_to_analyses as analyses
+import morphemes_to_analyses__what_if as what_if
+
+"""
+Address of the server (only reachable from localhost)
+"""
+HOST = '127.0.0.1'
+PORT = 8642
+
+"""
+Whether the words of morphemes.good are loaded as well (for /analyze and
+/what_if), and whether every request is logged
+"""
+MORPHEMES = True
+LOG_REQUESTS = False
+
+"""
+The morphemes of the words according to smor, set by load
+"""
+morphemes = {} # word -> morphemes
+
+
+def load(infile=INFILE, pattern_file=PATTERN_FILE, load_morphemes=MORPHEMES):
+    """Reads the rules and (if load_morphemes is set) the words."""
+    global morphemes
+    if load_morphemes:
+        what_if.load(infile, pattern_file)
+        morphemes = dict(what_if.records)
+    else:
+        load_rules(pattern_file)
+
+
+def apply_patterns(words):
+    """Returns the results of selnolig for the words."""
+    results = []
+    for word in words:
+        (selnolig_morphemes, applied_rules) = selnolig(word)
+        results.append({'word': word, 'selnolig': selnolig_morphemes,
+                        'applied_rules': applied_rules})
+    return results
+
+
+def analyze_words(words):
+    """Returns the results of selnolig for the words together with their
+    morphemes (None for unknown words) and whether they agree."""
+    results = apply_patterns(words)
+    for result in results:
+        result['morphemes'] = morphemes.get(result['word'])
+        result['good'] = None
+        if result['morphemes'] is not None:
+            result['good'] = result['morphemes'] == result['selnolig']
+    return results
+
+
+def read_patterns(lines):
+    """Returns the candidate patterns of the lines (cf.
+    morphemes_to_analyses__what_if.read_candidates) and a list of (line or
+    command, message) tuples for the invalid commands and the lines without
+    any command."""
+    candidates = []
+    errors = []
+    for line in lines:
+        invalid = len(errors)
+        found = what_if.read_candidates(line, errors)
+        if not found and len(errors) == invalid:
+            errors.append((line, 'No \\nolig{...}{...} or \\keeplig{...} pattern'))
+        candidates += found
+    return (candidates, errors)
+
+
+def judge_patterns(candidates):
+    """Returns the results of the candidate patterns (cf.
+    morphemes_to_analyses__what_if.what_if)."""
+    results = []
+    for (command, new_rules, new_keeps) in candidates:
+        words = what_if.what_if(new_rules, new_keeps)
+        result = {'pattern': command}
+        for kind in ['fixed', 'broken', 'unchanged']:
+            result[kind] = len(words[kind])
+        for kind in ['fixed', 'broken']:
+            result[kind + '_examples'] = [analysis._asdict() for analysis
+                                          in words[kind][:what_if.EXAMPLES]]
+        results.append(result)
+    return results
+
+
+def is_string_list(strings):
+    """Tells whether the argument is a list of strings."""
+    return (isinstance(strings, list) and
+            all([isinstance(string, basestring) for string in strings]))
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Answers the requests (cf. the module documentation)."""
+
+    protocol_version = 'HTTP/1.1' # keeps the connections open
+    wbufsize = -1 # sends every response at once (cf. handle_one_request)
+
+    def do_GET(self):
+        if self.path != '/':
+            return self.reply(404, {'error': 'unknown path ' + self.path})
+        self.reply(200, {'nolig': len(analyses.nolig),
+                         'keeplig': len(analyses.keeplig),
+                         'words': len(morphemes)})
+
+    def do_POST(self):
+        try:
+            body = self.rfile.read(int(self.headers.getheader('content-length', 0)))
+            request = json.loads(body or '{}')
+        except ValueError, e:
+            return self.reply(400, {'error': 'invalid request: ' + str(e)})
+        if not isinstance(request, dict):
+            return self.reply(400, {'error': 'invalid request: no JSON object'})
+        try:
+            self.answer(request)
+        except Exception, e:
+            self.log_error('%s', traceback.format_exc())
+            self.reply(500, {'error': 'internal error: ' + repr(e)})
+
+    def answer(self, request):
+        """Answers a POST request (a JSON object)."""
+        if self.path in ['/apply', '/analyze']:
+            words = request.get('words')
+            if not is_string_list(words):
+                return self.reply(400, {'error': 'no list of words'})
+            if self.path == '/apply':
+                results = apply_patterns(words)
+            else:
+                results = analyze_words(words)
+        elif self.path == '/what_if':
+            if not morphemes:
+                return self.reply(400, {'error': 'no words loaded'})
+            patterns = request.get('patterns')
+            if not is_string_list(patterns):
+                return self.reply(400, {'error': 'no list of patterns'})
+            (candidates, errors) = read_patterns(patterns)
+            if errors:
+                return self.reply(400, {'error': 'invalid patterns: ' +
+                                        ', '.join([command for (command, message) in errors]),
+                                        'invalid': [{'pattern': command, 'message': message}
+                                                    for (command, message) in errors]})
+            results = judge_patterns(candidates)
+        else:
+            return self.reply(404, {'error': 'unknown path ' + self.path})
+        self.reply(200, {'results': results})
+
+    def reply(self, status, response):
+        """Sends the response (a JSON object)."""
+        body = json.dumps(response) # (ASCII, which is encoded much faster)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if LOG_REQUESTS:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def log_error(self, format, *args):
+        BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+def main(host=HOST, port=PORT, infile=INFILE, pattern_file=PATTERN_FILE,
+         load_morphemes=MORPHEMES):
+    """Loads the rules (and words) and answers requests until interrupted."""
+    start = time()
+    load(infile, pattern_file, load_morphemes)
+    server = HTTPServer((host, port), Handler)
+    print 'Loaded in ' + str(time() - start) + 's, serving on ' + \
+          host + ':' + str(port)
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == '__main__':
+    main()
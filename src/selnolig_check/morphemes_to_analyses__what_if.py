@@ -0,0 +1,248 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+This module serves to judge candidate patterns for selnolig before adding them
+to the pattern file: it reads the words of morphemes.good and the rules once
+and then tells for every candidate \\nolig{...}{...} or \\keeplig{...} pattern
+(brackets expanded as by read_regex) how many words selnolig would newly get
+right (fixed), newly get wrong (broken) or not (unchanged) if the pattern
+were appended to the pattern file, together with some examples.
+The words containing a pattern are looked up in an index of the trigrams of
+all words (cf. find_words), so only these words are simulated again, together
+with the words several rules may apply to if the new nolig patterns change the
+order of these rules (cf. nolig_order).
+
+The candidates are given as arguments, or entered line by line.
+
+Version: 0.1
+
+
+Copyright (c) 2012-2013, Steffen Hildebrandt and Felix Lehmann
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+This software is provided by the copyright holders and contributors "as is" and
+any express or implied warranties, including, but not limited to, the implied
+warranties of merchantability and fitness for a particular purpose are
+disclaimed. In no event shall the copyright owner or contributors be liable for
+any direct, indirect, incidental, special, exemplary, or consequential damages
+(including, but not limited to, procurement of substitute goods or services;
+loss of use, data, or profits; or business interruption) however caused and
+on any theory of liability, whether in contract, strict liability, or tort
+(including negligence or otherwise) arising in any way out of the use of this
+software, even if advised of the possibility of such damage.
+"""
+
+import re
+import sys
+import codecs
+from array import array
+from time import time
+from morphemes_to_analyses import *
+import morphemes_to_analyses as analyses
+import morphemes_to_analyses__read_selnolig_patterns as patterns
+
+"""
+Maximal number of examples printed for every result
+"""
+EXAMPLES = 5
+
+"""
+The MorphemeRecords of all words, the index of their trigrams and the words
+several nolig rules may apply to (cf. candidate_rules), set by load
+"""
+records = []
+trigrams = {} # trigram -> array of the numbers of the words containing it
+several_rules = [] # (number of the word, its candidate rules)
+
+"""
+The commands of the pattern file understood as candidates
+"""
+nolig_regex = re.compile(ur'\\nolig\{([^}]*)\}[^{]*\{([^}]*)\}')
+keeplig_regex = re.compile(ur'\\keeplig\{([^}]*)\}')
+
+
+def load(infile=INFILE, pattern_file=PATTERN_FILE):
+    """Reads the rules and the words of the input file and builds the index
+    of the trigrams of the words."""
+    global records, several_rules
+    load_rules(pattern_file)
+    in_file = codecs.open(infile, 'r', 'utf-8')
+    records = [read_morpheme_line(line) for line in in_file]
+    in_file.close()
+    trigrams.clear()
+    several_rules = []
+    for (n, record) in enumerate(records):
+        word = record.word
+        rules = candidate_rules(word)
+        if len(rules) > 1: several_rules.append((n, rules))
+        for trigram in set([word[i:i+3] for i in range(len(word) - 2)]):
+            numbers = trigrams.get(trigram)
+            if numbers is None:
+                numbers = trigrams[trigram] = array('i')
+            numbers.append(n)
+
+
+def find_words(pattern):
+    """Returns the numbers of the words containing the pattern: of the words
+    containing its rarest trigram, only the ones actually containing the
+    pattern are kept (patterns shorter than a trigram are looked up in all
+    words)."""
+    if len(pattern) < 3:
+        return [n for (n, record) in enumerate(records) if pattern in record.word]
+    numbers = min([trigrams.get(pattern[i:i+3], ()) for i in range(len(pattern) - 2)],
+                  key=len)
+    return [n for n in numbers if pattern in records[n].word]
+
+
+def positions(rule, pattern):
+    """Returns all positions of the rule in the pattern."""
+    return [n for n in range(len(pattern)) if pattern.startswith(rule, n)]
+
+
+def read_candidates(line, errors=None):
+    """Returns the candidates of a line, i.e. a tuple (command, nolig rules,
+    keeplig patterns) for every \\nolig or \\keeplig command of the line, with
+    the nolig rules as a list of (pattern, parts) tuples (cf. nolig_rules).
+    Invalid commands are skipped and reported, or, if a list errors is given,
+    added to it as (command, message) tuples."""
+    def invalid(command, message, report=None):
+        if errors is None:
+            print (report or message).encode('utf-8')
+        else:
+            errors.append((command, message))
+    candidates = []
+    for match in nolig_regex.finditer(line):
+        try:
+            rules = nolig_rules(match.group(1), match.group(2))
+        except Exception, e:
+            invalid(match.group(0), unicode(e))
+            continue
+        if rules is None:
+            invalid(match.group(0), 'Nolig rule without a bar',
+                    '!!!!!  NOLIG RULE WITHOUT A BAR  !!!!!   ----->  ' + match.group(0))
+            continue
+        candidates.append((match.group(0), rules, []))
+    for match in keeplig_regex.finditer(line):
+        try:
+            candidates.append((match.group(0), [], read_regex(match.group(1))))
+        except Exception, e:
+            invalid(match.group(0), unicode(e))
+    return candidates
+
+
+def nolig_order(new_rules):
+    """Returns the positions of the rules in nolig if the given rules ((pattern,
+    parts) tuples) were read last: adding rules to nolig may change its order
+    (cf. order_noligs)."""
+    new_nolig = {}
+    for (rule, parts) in patterns.nolig_patterns.items() + new_rules:
+        new_nolig.update({rule : parts})
+    return dict([(rule, n) for (n, rule) in enumerate(new_nolig)])
+
+
+def what_if(new_rules, new_keeps):
+    """Simulates selnolig with the given nolig rules ((pattern, parts) tuples)
+    and keeplig patterns appended to the rules on all words containing one of
+    them, and on the words whose rules would be applied in another order. The
+    rules are applied in the order nolig would have (cf. order_noligs), and
+    new keeplig patterns come after the others.
+    Returns a dictionary of 'fixed', 'broken' and 'unchanged' to the list of
+    the AnalysisRecords (with the new results) of these words."""
+    new_noligs = dict(new_rules)
+    added = [rule for rule in new_noligs if rule not in analyses.nolig]
+    order = None # of the rules, if new ones are added (cf. nolig_order)
+    if added: order = nolig_order(new_rules)
+    # the keeplig patterns containing the rules, as far as they are new
+    extra_keeps = {}
+    for rule in added:
+        extra_keeps[rule] = [(k, positions(rule, k)) for k in analyses.keeplig
+                             if rule in k]
+    for k in new_keeps:
+        contained = [rule for rule in added if rule in k]
+        if analyses.rule_matcher is None:
+            contained += [rule for rule in analyses.nolig if rule in k]
+        else:
+            contained += [rule for (position, rule) in analyses.rule_matcher.find_all(k)]
+        for rule in set(contained):
+            extra_keeps.setdefault(rule, []).append((k, positions(rule, k)))
+
+    numbers = set()
+    for pattern in new_noligs.keys() + new_keeps:
+        numbers.update(find_words(pattern))
+    if order is not None and sorted(analyses.nolig, key=order.get) != analyses.nolig.keys():
+        # adding the rules changes the order of the old ones
+        numbers.update([n for (n, rules) in several_rules
+                        if sorted(rules, key=order.get) != list(rules)])
+    results = {'fixed': [], 'broken': [], 'unchanged': []}
+    for n in sorted(numbers):
+        (word, morphemes) = records[n]
+        old_rules = candidate_rules(word)
+        (old_morphemes, old_applied) = apply_rules(word, old_rules, analyses.nolig,
+                                                   keepligs_containing)
+        rules = list(old_rules) + [rule for rule in added if rule in word]
+        if order is not None and len(rules) > 1:
+            rules.sort(key=order.get)
+        noligs = dict([(rule, new_noligs.get(rule) or analyses.nolig[rule])
+                       for rule in rules])
+        keeps = dict([(rule, keepligs_containing.get(rule, []) +
+                       extra_keeps.get(rule, [])) for rule in rules])
+        (selnolig_morphemes, applied_rules) = apply_rules(word, rules, noligs, keeps)
+        analysis = AnalysisRecord(word, morphemes, selnolig_morphemes, applied_rules)
+        if old_morphemes != morphemes and selnolig_morphemes == morphemes:
+            results['fixed'].append(analysis)
+        elif old_morphemes == morphemes and selnolig_morphemes != morphemes:
+            results['broken'].append(analysis)
+        else:
+            results['unchanged'].append(analysis)
+    return results
+
+
+def print_what_if(candidate):
+    """Prints the results of a candidate (cf. read_candidates, what_if)."""
+    (command, new_rules, new_keeps) = candidate
+    start = time()
+    results = what_if(new_rules, new_keeps)
+    runtime = time() - start
+    print (command + ': ' +
+           unicode(sum([len(words) for words in results.values()])) + ' words, ' +
+           ', '.join([unicode(len(results[result])) + ' ' + result
+                      for result in ['fixed', 'broken', 'unchanged']]) +
+           ' (' + unicode(round(runtime * 1000, 2)) + ' ms)').encode('utf-8')
+    for result in ['fixed', 'broken']:
+        for analysis in results[result][:EXAMPLES]:
+            print ('  ' + result + ': ' + analysis_line(analysis)).encode('utf-8')
+
+
+def main(candidates=None, infile=INFILE, pattern_file=PATTERN_FILE):
+    """Loads the words and rules and prints the results for the given lines of
+    candidates, or for the lines entered until an empty one."""
+    start = time()
+    load(infile, pattern_file)
+    print 'Loaded', len(records), 'words in ' + str(time() - start) + 's'
+    if candidates:
+        for line in candidates:
+            for candidate in read_candidates(line):
+                print_what_if(candidate)
+        return
+    print 'Enter \\nolig{...}{...} or \\keeplig{...} patterns (an empty line quits):'
+    while True:
+        try:
+            line = raw_input('> ').decode(sys.stdin.encoding or 'utf-8')
+        except EOFError:
+            break
+        if not line.strip(): break
+        for candidate in read_candidates(line):
+            print_what_if(candidate)
+
+
+if __name__ == '__main__':
+    main([arg.decode(sys.getfilesystemencoding() or 'utf-8') for arg in sys.argv[1:]])
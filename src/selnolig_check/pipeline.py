@@ -0,0 +1,81 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+This module serves to run the stages smor_to_morphemes, morphemes_to_analyses
+and analyses_to_errors in a single process: the words are passed between the
+stages as records (cf. records) through generators, instead of writing them to
+the intermediate files (02-morphemes/*, 03-analyses/analyses.*) and reading,
+decoding and splitting them again in the next stage.
+The intermediate files are only written if TAPS is set (e.g. for debugging);
+the statistics of morphemes_to_analyses (03-analyses/stats.*) and the errors
+(04-errors/*) are written in any case.
+
+Version: 0.1
+
+
+Copyright (c) 2012-2013, Steffen Hildebrandt and Felix Lehmann
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+This software is provided by the copyright holders and contributors "as is" and
+any express or implied warranties, including, but not limited to, the implied
+warranties of merchantability and fitness for a particular purpose are
+disclaimed. In no event shall the copyright owner or contributors be liable for
+any direct, indirect, incidental, special, exemplary, or consequential damages
+(including, but not limited to, procurement of substitute goods or services;
+loss of use, data, or profits; or business interruption) however caused and
+on any theory of liability, whether in contract, strict liability, or tort
+(including negligence or otherwise) arising in any way out of the use of this
+software, even if advised of the possibility of such damage.
+"""
+
+import codecs
+from time import time
+
+import smor_to_morphemes
+import morphemes_to_analyses
+import analyses_to_errors
+
+"""
+Whether the intermediate files should be written as well
+"""
+TAPS = False
+
+
+def main(infile=smor_to_morphemes.INFILE,
+         pattern_file=morphemes_to_analyses.PATTERN_FILE, taps=TAPS):
+    """Reads the smor output and writes the errors (and statistics) of selnolig,
+    as the three stages would do one after another."""
+    start = time()
+    morphemes_to_analyses.load_rules(pattern_file)
+
+    files = []
+    if taps:
+        morpheme_files = smor_to_morphemes.open_out_files()
+        analysis_files = [codecs.open(morphemes_to_analyses.out_good, 'wb', 'utf-8'),
+                          codecs.open(morphemes_to_analyses.out_bad, 'wb', 'utf-8')]
+        files = morpheme_files.values() + analysis_files
+    else:
+        (morpheme_files, analysis_files) = (None, [None, None])
+
+    records = smor_to_morphemes.read_smor(smor_to_morphemes.read_smor_lines(infile))
+    morphemes = smor_to_morphemes.good_morphemes(records, morpheme_files)
+    analyses = morphemes_to_analyses.bad_analyses(morphemes, *analysis_files)
+    analyses_to_errors.process_records(analyses)
+
+    for f in files:
+        f.close()
+    morphemes_to_analyses.write_stats()
+
+    print 'Pipeline runtime: ' + str(time()-start) + 's'
+
+if __name__ == '__main__':
+    main()
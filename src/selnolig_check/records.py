@@ -0,0 +1,92 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+This module defines the records which are passed between the stages
+smor_to_morphemes, morphemes_to_analyses and analyses_to_errors, together with
+their representation as lines of the intermediate files (02-morphemes/*,
+03-analyses/*).
+
+Version: 0.1
+
+
+Copyright (c) 2012-2013, Steffen Hildebrandt and Felix Lehmann
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+This software is provided by the copyright holders and contributors "as is" and
+any express or implied warranties, including, but not limited to, the implied
+warranties of merchantability and fitness for a particular purpose are
+disclaimed. In no event shall the copyright owner or contributors be liable for
+any direct, indirect, incidental, special, exemplary, or consequential damages
+(including, but not limited to, procurement of substitute goods or services;
+loss of use, data, or profits; or business interruption) however caused and
+on any theory of liability, whether in contract, strict liability, or tort
+(including negligence or otherwise) arising in any way out of the use of this
+software, even if advised of the possibility of such damage.
+"""
+
+from collections import namedtuple
+
+"""
+Separators in the lines of the intermediate files
+"""
+MORPHEMES_SEPARATOR = u' -> '
+ANALYSIS_SEPARATOR = u' --- '
+
+"""
+The output of smor for a word: the word and the list of its analyses
+(the lines following '> word'), None if there is no result for it
+"""
+SmorRecord = namedtuple('SmorRecord', ['word', 'analyses'])
+
+"""
+A word and its morphemes (the word with MORPHEME_SPLIT_SYMBOL at the morpheme
+boundaries with ligatures, cf. smor_to_morphemes), None if there are none
+"""
+MorphemeRecord = namedtuple('MorphemeRecord', ['word', 'morphemes'])
+
+"""
+A word, its morphemes according to smor and according to selnolig, and the
+list of the selnolig rules applied to it (cf. morphemes_to_analyses)
+"""
+AnalysisRecord = namedtuple('AnalysisRecord', ['word', 'morphemes',
+                                               'selnolig_morphemes',
+                                               'applied_rules'])
+
+
+def morpheme_line(record):
+    """Returns the line (without newline) for a MorphemeRecord:
+    'word -> morphemes' or 'word'."""
+    if record.morphemes is None:
+        return record.word
+    return record.word + MORPHEMES_SEPARATOR + record.morphemes
+
+
+def read_morpheme_line(line):
+    """Returns the MorphemeRecord of a line 'word -> morphemes'."""
+    (word, morphemes) = line.rstrip().split(MORPHEMES_SEPARATOR)[:2]
+    return MorphemeRecord(word, morphemes)
+
+
+def analysis_line(record):
+    """Returns the line (without newline) for an AnalysisRecord:
+    'word --- morphemes --- selnolig morphemes --- applied rules'."""
+    return ANALYSIS_SEPARATOR.join([record.word, record.morphemes,
+                                    record.selnolig_morphemes,
+                                    ','.join(record.applied_rules)])
+
+
+def analysis_parts(record):
+    """Returns the parts of an AnalysisRecord as analyses_to_errors splits
+    its lines (cf. analyses_to_errors.splitline), without formatting and
+    splitting the line."""
+    return [record.word, record.morphemes, record.selnolig_morphemes,
+            ','.join(record.applied_rules)]
@@ -30,10 +30,17 @@ on any theory of liability, whether in contract, strict liability, or tort
 software, even if advised of the possibility of such damage.
 """
 
+import os
 import re
+import sys
 import codecs
 from time import time
+from multiprocessing import Pool
 from Ligatures import *
+from records import *
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, 'testing_dictionary'))
+from streams import shard_boundaries, concatenate
 
 """
 The symbol which is inserted for a morpheme boundary
@@ -43,17 +50,41 @@ MORPHEME_SPLIT_SYMBOL = u'|'
 """
 Definition of input and output files
 """
-in_file = codecs.open('01-smor/smor', 'r', 'latin-1') # smor writes to latin-1
+INFILE = '01-smor/smor' # smor writes to latin-1
 
-output_good = codecs.open('02-morphemes/morphemes.good', 'wb', 'utf-8')
-output_different_possibilities = codecs.open(
-    '02-morphemes/morphemes.differentPossibilities', 'wb', 'utf-8')
-output_bad  = codecs.open('02-morphemes/morphemes.bad', 'wb', 'utf-8')
-output_bad_oldorth = codecs.open(
-    '02-morphemes/morphemes.bad.oldorth', 'wb', 'utf-8')
+output_good = '02-morphemes/morphemes.good'
+output_different_possibilities = '02-morphemes/morphemes.differentPossibilities'
+output_bad  = '02-morphemes/morphemes.bad'
+output_bad_oldorth = '02-morphemes/morphemes.bad.oldorth'
 
 output = [output_good, output_different_possibilities, output_bad, output_bad_oldorth]
 
+"""
+Number of worker processes, each processing a byte range of the input file
+(and writing its own shard of every output file, which are concatenated in
+the end); 1 means that everything is done in this process
+"""
+PROCESSES = 1
+
+"""
+Whether the shard files should be kept after they have been concatenated
+"""
+KEEP_SHARDS = False
+
+"""
+File with further fixes for known smor bugs (cf. smor_fixes), if it exists:
+one word (or part of a word) per line, in which MORPHEME_SPLIT_SYMBOL marks
+the morpheme boundary missed by smor, e.g. 'beauf|trag' (utf-8, lines starting
+with '#' are comments)
+"""
+FIXES_FILE = 'smor_fixes.txt'
+
+
+def open_out_files(suffix=''):
+    """Opens all output files and returns a dictionary from their names to them.
+    The suffix is appended to the file names (cf. PROCESSES)."""
+    return dict([(name, codecs.open(name + suffix, 'wb', 'utf-8')) for name in output])
+
 
 """
 A list of fixes for known smor bugs
@@ -89,17 +120,77 @@ smor_fixes = [(u'beauftrag', u'beauf' + MORPHEME_SPLIT_SYMBOL + u'trag'),
               (u'Offline', u'Off' + MORPHEME_SPLIT_SYMBOL + u'line')
               ]
 
-"""
-The current line (it was the easiest way make this variable a global,
-since several methods may be interacting using it)
-"""
-line = ''
 
+def read_fixes(fixes_file):
+    """Reads the fixes from the given file (cf. FIXES_FILE) and returns them as
+    a list of tuples (word, fixed word) like smor_fixes."""
+    try:
+        in_file = codecs.open(fixes_file, 'r', 'utf-8')
+    except IOError:
+        return []
+    fixes = []
+    for line in in_file:
+        line = line.strip()
+        word = line.replace(MORPHEME_SPLIT_SYMBOL, u'')
+        if word and not line.startswith('#'):
+            fixes.append((word, line))
+    in_file.close()
+    return fixes
+
+
+def overlap(a, b):
+    """Returns true if the strings a and b overlap, i.e. if one of them contains
+    the other or a suffix of one of them is a prefix of the other."""
+    if a in b or b in a: return True
+    for (first, second) in [(a, b), (b, a)]:
+        # the suffixes of first starting with the first character of second
+        n = first.find(second[0], 1)
+        while n != -1:
+            if second.startswith(first[n:]): return True
+            n = first.find(second[0], n + 1)
+    return False
+
+
+def conflict(fix, other_fix):
+    """Returns true if the order matters in which the two fixes (word, fixed
+    word) are applied, i.e. if the word of one of them overlaps the word or the
+    fixed word of the other."""
+    return (overlap(fix[0], other_fix[0]) or overlap(fix[0], other_fix[1])
+            or overlap(fix[1], other_fix[0]))
+
+
+def compile_fixes(fixes):
+    """Compiles the fixes (list of tuples (word, fixed word), cf. smor_fixes)
+    into a list of stages (regular expression, dictionary from word to fixed
+    word), each of which applies all of its fixes in a single scan (the regular
+    expression is compiled from the trie of the words, so its cost does not
+    grow with the number of fixes).
+    The fixes are applied one after the other by the original fix_smor. Fixes
+    without a conflict can be applied in any order, i.e. all at once, so every
+    fix is put into the first stage after the stages of all fixes before it
+    which it conflicts with; this gives the same result.
+    """
+    stages = [] # stage of every fix
+    for (n, fix) in enumerate(fixes):
+        stages.append(max([stages[m] + 1 for m in range(n)
+                           if conflict(fixes[m], fix)] + [0]))
+    compiled = []
+    for stage in range(max(stages + [-1]) + 1):
+        replacements = dict([fixes[n] for n in range(len(fixes))
+                             if stages[n] == stage])
+        compiled.append((re.compile(patterns_expression(replacements)),
+                         replacements))
+    return compiled
 
-def nextline():
-    """Loads the next word of the input into the the global variable line."""
-    global line
-    line = in_file.readline().rstrip() # remove newline character
+
+"""
+All fixes (smor_fixes and the ones from FIXES_FILE), compiled into stages, and
+a regular expression matching the words of all of them (most words do not
+contain any of them and are not fixed at all)
+"""
+fixes = smor_fixes + read_fixes(FIXES_FILE)
+fix_stages = compile_fixes(fixes)
+fixes_regex = re.compile(patterns_expression([fix[0] for fix in fixes]))
 
 
 def write(word, out_file):
@@ -107,71 +198,176 @@ def write(word, out_file):
     out_file.write(unicode(word + '\n'))
 
 
+"""
+The symbols cut out of a line of the smor output by cut_unnecessary, as a
+single regular expression (the rules are translated from a perl script created
+by Helmut Schmid (University of Stuttgart), which applies them one after the
+other; cf. smor_to_morphemes__benchmark.cut_unnecessary_reference):
+ - ':<>' after a tag (the tag is kept, '>:<>' --> '>')
+ - a tag followed by ':', unless followed by '<>' as well
+ - any other symbol but a backslash followed by ':'
+   (the '>' of a tag only if the ':' is not followed by '<>')
+ - the empty symbol '<>'
+"""
+cut_regex = re.compile(r'(?<=>):<>|<[^<>]*>:(?!<>)|[^\\>]:|>:(?!<>)|<>')
+
+"""
+Insertions of the <IPREF> tag: (tag which has to occur, regular expression)
+original perl-commands: s/([Gg]e)(.*?<PPast>)/$1<IPREF>$2/; s/(zu)(.*?<zu>)/$1<IPREF>$2/;
+"""
+ipref_regexes = [(u'<Ge-Nom>', re.compile('([Gg]e)(.*?<Ge-Nom>)')),
+                 (u'<PPast>', re.compile('([Gg]e)(.*?<PPast>)')),
+                 (u'<zu>', re.compile('(zu)(.*?<zu>)'))]
+
+
 def cut_unnecessary(s):
     """Cuts / replaces unnecessary symbols out of the string s representing a line
     in the smor output
-    The rules are translated from a perl script created by Helmut Schmid (University
-    of Stuttgart).
+    All symbols are cut in a single scan of the line (cf. cut_regex), which gives
+    the same result as the original rules for every line smor writes (i.e.
+    every sequence of symbols and pairs of symbols 'a:b').
     """
-    s = re.sub('>:<>', '>', s)
-    s = re.sub('<[^<>]*>:', '', s) #[^x]  --> everything except x
-    # escaping backslash needs '\\\\' since it must be escaped
-    # both in the regex and in the string itself!
-    s = re.sub('[^\\\\]:', '', s)
-    s = re.sub('<>', '', s)
-
-    s = re.sub('([Gg]e)(.*?<Ge-Nom>)',
-               lambda m: m.group(1) + '<IPREF>' + m.group(2),
-               s)
-    # original perl-command: """ s/([Gg]e)(.*?<PPast>)/$1<IPREF>$2/; """
-    s = re.sub('([Gg]e)(.*?<PPast>)',
-               lambda m: m.group(1) + '<IPREF>' + m.group(2),
-               s)
-    # original perl-command: """ s/(zu)(.*?<zu>)/$1<IPREF>$2/; """
-    s = re.sub('(zu)(.*?<zu>)',
-               lambda m: m.group(1) + '<IPREF>' + m.group(2),
-               s)
+    s = cut_regex.sub(u'', s)
+    for (tag, regex) in ipref_regexes:
+        if tag in s: # the regular expression can only match if the tag occurs
+            s = regex.sub(u'\\1<IPREF>\\2', s)
     return s
 
 
 def fix_smor(word):
     """Fixes errors in the morpheme boundaries of the given word if it is one of
-    the known smor errors (cf. list smor_fixes)."""
-    for fix in smor_fixes:
-        word = re.sub(fix[0], fix[1], word)
+    the known smor errors (cf. list smor_fixes and FIXES_FILE)."""
+    if fixes_regex.search(word) is None: return word
+    for (regex, replacements) in fix_stages:
+        word = regex.sub(lambda match: replacements[match.group(0)], word)
     return word
 
 
+"""
+The tags of smor at which cut_unnecessary's output is split into morphemes
+"""
+tag_regex = re.compile('<\+?\w+\-?\w*>|$')
+
+"""
+All ways a ligature can go across a morpheme boundary: (end of the morpheme
+before the boundary, beginning of the morpheme after it), and their lengths
+"""
+boundary_ligs = set([(lig.glyph[:n], lig.glyph[n:])
+                     for lig in LIGS for n in range(1, len(lig))])
+boundary_lengths = sorted(set([(len(end), len(beginning))
+                               for (end, beginning) in boundary_ligs]))
+
+"""
+Maximal number of analyses memoized by get_lig_morphemes (the same analysis,
+i.e. output of cut_unnecessary, recurs for many inflected forms of a word)
+"""
+MEMO_SIZE = 100000
+lig_morphemes_memo = {}
+
+
 def get_lig_morphemes(s):
     """Takes a line of smor output and replaces every from smor indicated morpheme
     boundary by:
      - MORPHEME_SPLIT_SYMBOL, if there is a ligature across the morpheme boundary
      - the empty string, otherwise
+    The result is memoized for the analysis (cf. MEMO_SIZE).
     """
-    cut = re.split('<\+?\w+\-?\w*>|$', cut_unnecessary(s))
-    morphemes = [morph for morph in cut if morph != '']
-    result = morphemes[0]
+    analysis = cut_unnecessary(s)
+    result = lig_morphemes_memo.get(analysis)
+    if result is None:
+        if len(lig_morphemes_memo) >= MEMO_SIZE:
+            lig_morphemes_memo.clear()
+        result = lig_morphemes(analysis)
+        lig_morphemes_memo[analysis] = result
+    return result
+
+
+def lig_morphemes(analysis):
+    """Does the work of get_lig_morphemes for the output of cut_unnecessary."""
+    morphemes = [morph for morph in tag_regex.split(analysis) if morph != '']
+    result = [morphemes[0]]
     for n in range(0, len(morphemes)-1):
-        lig_found = False # stop searching for ligs if a morpheme boundary was inserted
-        for lig in LIGS:
-            k = len(lig)
-            # Problem here: Ligatures consisting of 3 letters (at which positions 
-            # of morphemes[n] + [n+1] are we looking for the morphemes?)
-            # Solution: look at morphemes[n][-(k-1):]+morphemes[n+1][:(k-1)]
-            # this garuantees that the ligature goes across the boundary
-            # and catches all relevant cases.
-            if (not lig_found and
-                    lig.glyph in morphemes[n][-(k-1):] + morphemes[n+1][:(k-1)]):
-                result += MORPHEME_SPLIT_SYMBOL + morphemes[n+1]
-                lig_found = True
-        if not lig_found:
-            result += morphemes[n+1]
-    return fix_smor(result)
-
-
-def process():
-    """This method processes a word and writes every word to its dedicated
-    output file:
+        # A ligature counts if it goes across the boundary and lies within
+        # morphemes[n] + morphemes[n+1], i.e. if it consists of an end of
+        # morphemes[n] and a beginning of morphemes[n+1] (cf. boundary_ligs).
+        for (end, beginning) in boundary_lengths:
+            if (morphemes[n][-end:], morphemes[n+1][:beginning]) in boundary_ligs:
+                result.append(MORPHEME_SPLIT_SYMBOL)
+                break
+        result.append(morphemes[n+1])
+    return fix_smor(u''.join(result))
+
+
+def read_smor_lines(infile, start=0, end=None):
+    """Yields the lines of the smor output (decoded from latin-1) of all words
+    whose line '> word' starts within the byte range [start, end) of the file:
+    if start is not the beginning of such a line, the reading resyncs on the
+    next one, and the analyses of the last word are read beyond end.
+    So every word is read exactly once if the file is split into byte ranges
+    (cf. shard_boundaries), and read_smor yields the same records for the
+    lines of all byte ranges as for the whole file.
+    """
+    in_file = open(infile, 'rb')
+    if start > 0:
+        # if the byte before start is a newline, start is a line start already
+        in_file.seek(start - 1)
+        in_file.readline()
+    pos = in_file.tell()
+    line = in_file.readline()
+    if start > 0:
+        while line and not line.startswith('>'):
+            pos += len(line)
+            line = in_file.readline()
+    while line and (end is None or pos < end or not line.startswith('>')):
+        yield line.decode('latin-1')
+        pos += len(line)
+        line = in_file.readline()
+    in_file.close()
+
+
+def input_end(infile):
+    """Returns the position of the first empty line of the file, at which the
+    input ends (cf. read_smor), or the size of the file if there is none.
+    The file is split into byte ranges before this position only, s.t. no
+    worker process reads the words after it."""
+    in_file = open(infile, 'rb')
+    pos = 0
+    for line in in_file:
+        if not line.decode('latin-1').rstrip(): break
+        pos += len(line)
+    in_file.close()
+    return pos
+
+
+def read_smor(lines):
+    """Takes the lines of the smor output and yields a SmorRecord for every word
+    (i.e. for every line '> word' and the lines following it).
+    As before, the input ends at an empty line following the analyses of a word.
+    """
+    lines = (l.rstrip() for l in lines) # remove newline character
+    line = next(lines, '')
+    while line:
+        while not line.startswith('>'):
+            line = next(lines, None)
+            if line is None: return
+        word = line[2:]
+
+        line = next(lines, '')
+        if line.startswith('no result'):
+            yield SmorRecord(word, None)
+            line = next(lines, '')
+            continue
+
+        analyses = []
+        while line and not line.startswith('>'):
+            analyses.append(line)
+            line = next(lines, '')
+        yield SmorRecord(word, analyses)
+
+
+def process(record):
+    """This method processes a word (SmorRecord) and returns a list of tuples
+    (output file, MorphemeRecord) for its dedicated output files:
      - If there is no result for a word, it is written to output_bad.
      - If a smor analysis contains an OLDORTH tag, the word is written to
        output_bad_oldorth (see documentation for further explanation on this).
@@ -179,47 +375,83 @@ def process():
        output_different possibilities.
      - Otherwise the word seems to be good and is written to output_good.
     """
-    while not line.startswith('>'):
-        nextline()
-    word = line[2:]
-
-    nextline()
-    if line.startswith('no result'):
-        write(word, output_bad)
-        nextline()
-        return
+    word = record.word
+    if record.analyses is None:
+        return [(output_bad, MorphemeRecord(word, None))]
 
+    result = []
     morphemes = set([])
-    while line and not line.startswith('>'):
+    for line in record.analyses:
         if '<OLDORTH>' in line:
-            write(word + ' -> ' + cut_unnecessary(line), output_bad_oldorth)
+            result.append((output_bad_oldorth,
+                           MorphemeRecord(word, cut_unnecessary(line))))
         else:
             morphemes.add(get_lig_morphemes(line))
-        nextline()
 
     if len(morphemes) == 1:
-        write(word + ' -> ' + morphemes.pop(), output_good)
+        result.append((output_good, MorphemeRecord(word, morphemes.pop())))
     elif len(morphemes) == 0:
         () # all analyses sorted out because of OLDORTH, do nothing
     else:
-        write(word + ' -> ' + ' , '.join(morphemes),
-              output_different_possibilities)
-    return
+        result.append((output_different_possibilities,
+                       MorphemeRecord(word, ' , '.join(morphemes))))
+    return result
+
+
+def good_morphemes(records, files=None):
+    """Takes SmorRecords and yields the MorphemeRecords for output_good (i.e.
+    the input of morphemes_to_analyses) without writing them to a file.
+    The records for the other output files are dropped, unless a dictionary of
+    opened output files is given (cf. open_out_files), to which all records are
+    written (cf. pipeline)."""
+    for record in records:
+        for (out_file, morphemes) in process(record):
+            if files is not None:
+                write(morpheme_line(morphemes), files[out_file])
+            if out_file == output_good:
+                yield morphemes
+
+
+def process_shard(shard):
+    """Processes the words of a byte range (infile, start, end) of the input
+    file, writing them to the output files with the given suffix
+    (shard = (infile, start, end, suffix)). Runs in a worker process, unless
+    there is only one."""
+    (infile, start, end, suffix) = shard
+    files = open_out_files(suffix)
+    for record in read_smor(read_smor_lines(infile, start, end)):
+        for (out_file, morphemes) in process(record):
+            write(morpheme_line(morphemes), files[out_file])
+    for f in files.values():
+        f.close()
+    return suffix
 
 
-def main():
-    """Reads from the input file and processes the entries using the function process."""
+def main(infile=INFILE, processes=PROCESSES):
+    """Reads from the input file and processes the entries using the function process
+    (in several processes, cf. PROCESSES)."""
     start = time()
-    
-    nextline()
-    while line:
-        process()
-    
-    in_file.close()
-    for f in output:
-        f.close()
+
+    if processes > 1:
+        boundaries = shard_boundaries(infile, processes, input_end(infile))
+        shards = [(infile, s, e, '.shard%03d' % n)
+                  for (n, (s, e)) in enumerate(boundaries)]
+        pool = Pool(processes)
+        suffixes = pool.map(process_shard, shards, 1)
+        pool.close()
+        pool.join()
+        print 'Used', processes, 'processes for', len(suffixes), 'shards'
+        for name in output:
+            shard_files = [name + suffix for suffix in suffixes]
+            concatenate(shard_files, name)
+            if not KEEP_SHARDS:
+                for shard_file in shard_files:
+                    os.remove(shard_file)
+    else:
+        process_shard((infile, 0, None, ''))
 
     print 'Runtime: ' + str(time()-start) + 's'
 
 
-main()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+This module serves to compare smor_to_morphemes.cut_unnecessary with the
+original rules (one regular expression after the other): it checks that both
+give the same result for all analyses of the smor output (and for random
+analyses built up of the symbols smor writes) and measures their throughput.
+Likewise fix_smor is compared with the original fix_smor (one re.sub per fix)
+on the words of the smor output and on random words built up of parts of the
+fixes.
+Finally get_lig_morphemes is compared with the original get_lig_morphemes
+(looking at all ligatures at every morpheme boundary, applied after the
+original cut_unnecessary and fix_smor), which gives the throughput of the
+stage per analysis line before and after.
+
+Version: 0.1
+
+
+Copyright (c) 2012-2013, Steffen Hildebrandt and Felix Lehmann
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+This software is provided by the copyright holders and contributors "as is" and
+any express or implied warranties, including, but not limited to, the implied
+warranties of merchantability and fitness for a particular purpose are
+disclaimed. In no event shall the copyright owner or contributors be liable for
+any direct, indirect, incidental, special, exemplary, or consequential damages
+(including, but not limited to, procurement of substitute goods or services;
+loss of use, data, or profits; or business interruption) however caused and
+on any theory of liability, whether in contract, strict liability, or tort
+(including negligence or otherwise) arising in any way out of the use of this
+software, even if advised of the possibility of such damage.
+"""
+
+import random
+from itertools import islice
+from smor_to_morphemes import *
+
+"""
+Maximal number of analyses read from the input file / number of random analyses
+(and random words)
+"""
+MAX_ANALYSES = 1000000
+RANDOM_ANALYSES = 200000
+RANDOM_WORDS = 200000
+
+"""
+Symbols of which the random analyses are built up
+"""
+random_tags = [u'<Ge-Nom>', u'<PPast>', u'<zu>', u'<+NN>', u'<NN>', u'<Fem>',
+               u'<Nom>', u'<Sg>', u'<CAP>', u'<VPART>', u'<SUFF>', u'<OLDORTH>']
+random_chars = list(u'aefilnortuzGAF') + [u'\\:', u'\\<', u'\\>', u'\\\\', u'-']
+
+
+def cut_unnecessary_reference(s):
+    """The original cut_unnecessary."""
+    s = re.sub('>:<>', '>', s)
+    s = re.sub('<[^<>]*>:', '', s) #[^x]  --> everything except x
+    # escaping backslash needs '\\\\' since it must be escaped
+    # both in the regex and in the string itself!
+    s = re.sub('[^\\\\]:', '', s)
+    s = re.sub('<>', '', s)
+
+    s = re.sub('([Gg]e)(.*?<Ge-Nom>)',
+               lambda m: m.group(1) + '<IPREF>' + m.group(2),
+               s)
+    # original perl-command: """ s/([Gg]e)(.*?<PPast>)/$1<IPREF>$2/; """
+    s = re.sub('([Gg]e)(.*?<PPast>)',
+               lambda m: m.group(1) + '<IPREF>' + m.group(2),
+               s)
+    # original perl-command: """ s/(zu)(.*?<zu>)/$1<IPREF>$2/; """
+    s = re.sub('(zu)(.*?<zu>)',
+               lambda m: m.group(1) + '<IPREF>' + m.group(2),
+               s)
+    return s
+
+
+def fix_smor_reference(word):
+    """The original fix_smor (applied to all fixes)."""
+    for fix in fixes:
+        word = re.sub(fix[0], fix[1], word)
+    return word
+
+
+def get_lig_morphemes_reference(s):
+    """The original get_lig_morphemes."""
+    cut = re.split('<\+?\w+\-?\w*>|$', cut_unnecessary_reference(s))
+    morphemes = [morph for morph in cut if morph != '']
+    result = morphemes[0]
+    for n in range(0, len(morphemes)-1):
+        lig_found = False # stop searching for ligs if a morpheme boundary was inserted
+        for lig in LIGS:
+            k = len(lig)
+            if (not lig_found and
+                    lig.glyph in morphemes[n][-(k-1):] + morphemes[n+1][:(k-1)]):
+                result += MORPHEME_SPLIT_SYMBOL + morphemes[n+1]
+                lig_found = True
+        if not lig_found:
+            result += morphemes[n+1]
+    return fix_smor_reference(result)
+
+
+def random_word():
+    """Returns a random word built up of parts of the words and fixed words of
+    the fixes and random letters."""
+    parts = []
+    for n in range(random.randint(1, 6)):
+        if random.random() < 0.7:
+            part = random.choice(random.choice(fixes))
+            start = random.randint(0, len(part) / 2)
+            parts.append(part[start:random.randint(start + 1, len(part))])
+        else:
+            parts.append(random.choice(u'abefilnrstu|'))
+    return u''.join(parts)
+
+
+def random_symbol(empty=False):
+    """Returns a random symbol (the empty symbol '<>' only if empty is true)."""
+    if empty and random.random() < 0.2: return u'<>'
+    if random.random() < 0.35: return random.choice(random_tags)
+    return random.choice(random_chars)
+
+
+def random_analysis():
+    """Returns a random sequence of symbols and pairs of symbols 'a:b'."""
+    symbols = []
+    for n in range(random.randint(1, 20)):
+        if random.random() < 0.5:
+            symbols.append(random_symbol())
+        else:
+            symbols.append(random_symbol(True) + u':' + random_symbol(True))
+    return u''.join(symbols)
+
+
+def read_records(infile):
+    """Returns the SmorRecords of the smor output (an empty list if there is none)."""
+    try:
+        return list(islice(read_smor(read_smor_lines(infile)), MAX_ANALYSES))
+    except IOError:
+        return []
+
+
+def benchmark(function, analyses):
+    """Returns the runtime of applying the function to all analyses."""
+    lig_morphemes_memo.clear() # start without any memoized analyses
+    start = time()
+    for analysis in analyses:
+        function(analysis)
+    return time() - start
+
+
+def compare(name, function, reference, analyses):
+    """Checks that function and reference give the same results for all
+    analyses (or words) and prints the runtimes of both."""
+    differences = 0
+    for analysis in analyses:
+        if function(analysis) != reference(analysis):
+            differences += 1
+            if differences <= 10:
+                print ('DIFFERENT ' + name + ': ' + analysis).encode('utf-8')
+    if differences == 0:
+        print name + ': identical -- success!'
+    else:
+        print name + ': different for', differences, 'analyses -- uh-oh.'
+
+    original = benchmark(reference, analyses)
+    new = benchmark(function, analyses)
+    print 'Original: ' + str(original) + 's (' + \
+          str(original / max(len(analyses), 1) * 1e6) + ' us per line)'
+    print 'New:      ' + str(new) + 's (' + \
+          str(new / max(len(analyses), 1) * 1e6) + ' us per line)'
+    print 'Speedup:  ' + str(original / max(new, 1e-9))
+
+
+def main(infile=INFILE):
+    random.seed(0)
+    records = read_records(infile)
+    analyses = [line for record in records if record.analyses
+                for line in record.analyses][:MAX_ANALYSES]
+    print 'Analyses:', len(analyses), '+', RANDOM_ANALYSES, 'random analyses'
+    analyses += [random_analysis() for n in xrange(RANDOM_ANALYSES)]
+    compare('cut_unnecessary', cut_unnecessary, cut_unnecessary_reference, analyses)
+
+    words = [record.word for record in records]
+    print 'Words:', len(words), '+', RANDOM_WORDS, 'random words,', \
+          len(fixes), 'fixes in', len(fix_stages), 'stages'
+    words += [random_word() for n in xrange(RANDOM_WORDS)]
+    compare('fix_smor', fix_smor, fix_smor_reference, words)
+
+    # (an analysis without any morpheme is an error in both)
+    analyses = [analysis for analysis in analyses if '<OLDORTH>' not in analysis
+                and ''.join(tag_regex.split(cut_unnecessary(analysis)))]
+    print 'Analyses without OLDORTH (and with morphemes):', len(analyses)
+    compare('get_lig_morphemes', get_lig_morphemes, get_lig_morphemes_reference,
+            analyses)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,8 @@ Definition of a class for ligatures
 Version: 0.1
 """
 
+import re
+
 """
 A ligature is defined by a glyph which is just a string.
 """
@@ -60,3 +62,80 @@ LIGS = [ff, fi, fl, ffi, ffl, ft, fb, fh, fk, fj, fff, th]
 List of all ligatures consisting of exactly two letters
 """
 LIGS_TWO_GLYPHS = [lig for lig in LIGS if len(lig) == 2]
+
+"""
+Finds all occurrences of a set of patterns (strings) in a word in a single
+pass. The patterns are compiled into a trie, which in turn is compiled into
+a regular expression (so the automaton is run by the regex engine, which
+follows only the branches of the trie matching the word).
+If case_sensitive is False, patterns and words are compared in lowercase
+(positions still refer to the word, since lower() keeps the length).
+"""
+class PatternMatcher:
+
+    """
+    Constructor
+    """
+    def __init__(self, patterns, case_sensitive=True):
+        self.case_sensitive = case_sensitive
+        self.patterns = {} # key (lowercase if not case_sensitive) -> patterns
+        for pattern in patterns:
+            if not pattern: continue
+            key = pattern
+            if not case_sensitive: key = key.lower()
+            same_key = self.patterns.setdefault(key, [])
+            if pattern not in same_key: same_key.append(pattern)
+        trie = {}
+        for key in self.patterns:
+            node = trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[None] = True # end of a key
+        if trie: expression = trie_expression(trie)
+        else: expression = '(?!)' # matches nothing
+        # a lookahead, s.t. overlapping occurrences are found as well
+        self.regex = re.compile('(?=(' + expression + '))')
+        # key -> all patterns which are a prefix of it (shortest first)
+        self.prefixes = dict([(key, [pattern for n in range(1, len(key) + 1)
+                                     for pattern in self.patterns.get(key[:n], [])])
+                              for key in self.patterns])
+
+    """
+    Returns a list of (position, pattern) tuples for all occurrences
+    of all patterns in the word, ordered by position (and length)
+    """
+    def find_all(self, word):
+        if not self.case_sensitive: word = word.lower()
+        found = []
+        for match in self.regex.finditer(word):
+            position = match.start()
+            for pattern in self.prefixes[match.group(1)]:
+                found.append((position, pattern))
+        return found
+
+    """
+    Returns true if the word contains any of the patterns
+    """
+    def contains_any(self, word):
+        if not self.case_sensitive: word = word.lower()
+        return self.regex.search(word) is not None
+
+"""
+Returns a regular expression for a (sub)trie, matching the longest key
+which is a prefix of the input
+"""
+def trie_expression(node):
+    alternatives = [re.escape(char) + trie_expression(node[char])
+                    for char in sorted(node) if char is not None]
+    if not alternatives: return ''
+    if len(alternatives) == 1 and None not in node: return alternatives[0]
+    expression = '(?:' + '|'.join(alternatives) + ')'
+    if None in node: expression += '?' # greedy, i.e. longer keys first
+    return expression
+
+"""
+Matchers for all ligatures, case sensitive and ignoring the case
+"""
+LIG_MATCHER = PatternMatcher([lig.glyph for lig in LIGS])
+LIG_MATCHER_IGNORE_CASE = PatternMatcher([lig.glyph for lig in LIGS],
+                                         case_sensitive=False)
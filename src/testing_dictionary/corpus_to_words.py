@@ -7,11 +7,63 @@ Version: 0.1
 """
 
 import re
-import codecs
+import os
 import unicodedata
 from time import time
+from itertools import islice
+from multiprocessing import Pool
 
 from Ligatures import *
+from external_sort import *
+from streams import *
+
+"""
+Number of processes used for extracting the words.
+If it is greater than 1, the corpus is split into newline-aligned byte ranges
+(shards, or blocks of lines if it is compressed) which are processed in
+parallel, each of them writing to one of processes output files
+(outfile + '.shard000', outfile + '.shard001', ...; the blocks of a compressed
+corpus are appended to them in turn).
+Afterwards the shards are concatenated to the output file, so the result is
+identical to the one of a sequential run.
+"""
+PROCESSES = 1
+
+"""
+Whether the shard files should be kept after they have been concatenated
+"""
+KEEP_SHARDS = False
+
+"""
+Compression of the output file ('', '.gz', '.bz2' or '.xz'); the extension
+is appended to the name of the output file.
+The input file (the corpus) may be compressed in any of these formats,
+which is recognized by its extension (e.g. 'sdewac-v3.corpus.gz').
+"""
+OUTPUT_COMPRESSION = ''
+
+"""
+Whether the output should contain every distinct word only once, together with
+its frequency in the corpus ('word<TAB>count', sorted by word), instead of
+one line per occurrence. The counting keeps at most MAX_ENTRIES distinct
+words in memory and spills the rest to temporary files.
+"""
+TYPE_FREQUENCIES = False
+
+"""
+Whether only words which may contain a ligature should be written, i.e.
+words containing a ligature once all non-letters are removed (this covers
+all words words_to_ligs sorts into the ligs.good.*, ligs.review.* and
+ligs.bad.* files, including the ligatures across punctuation).
+Note that the ligs.interesting.* files of words_to_ligs will then only
+contain words with ligatures, too.
+"""
+LIG_FILTER = False
+
+"""
+Regular expression matching the tags of the corpus
+"""
+tag_regex = re.compile('<[^>]*>')
 
 def contains_letters(token):
     """Returns true if a given (unicode) token contains at least one letter."""
@@ -19,25 +71,147 @@ def contains_letters(token):
         if unicodedata.category(char)[0] == 'L': return True
     return False
 
-def main(infile, outfile):
+"""
+First letters of all ligatures (a word without any of them can't contain
+a ligature)
+"""
+lig_initials = set([lig.glyph[0] for lig in LIGS])
+
+def may_contain_lig(token):
+    """Returns true if a given (unicode) token contains a ligature after all
+    non-letters have been removed (cf. words_to_ligs.remove_punctuation)."""
+    for initial in lig_initials:
+        if initial in token: break
+    else:
+        return False
+    letters = ''.join([char for char in token
+                       if unicodedata.category(char)[0] == 'L'])
+    return LIG_MATCHER.contains_any(letters)
+
+def extract_words(lines, lig_filter=False):
+    """Takes an iterable of (unicode) lines of the corpus and yields all words
+    we want to have (only those which may contain a ligature if lig_filter
+    is set)."""
+    if lig_filter: accept = may_contain_lig
+    else: accept = contains_letters
+    for line in lines:
+        line = tag_regex.sub('', line).split()
+        for token in line:
+            if accept(token):
+                yield token
+
+def write_words(words, outfile, type_frequencies, mode='wb'):
+    """Writes the words to the output file, either one line per occurrence
+    or (if type_frequencies is set) one line 'word<TAB>count' per word.
+    With mode 'ab', they are appended to it."""
+    out_file = open_output(outfile, mode)
+    if type_frequencies:
+        counter = SpillingCounter()
+        for word in words:
+            counter.add(word)
+        write_frequencies(counter.items(), out_file)
+        counter.close()
+    else:
+        for word in words:
+            out_file.write(word + '\n')
+    out_file.close()
+
+def process_shard(shard):
+    """Extracts the words of a shard (source, outfile, type_frequencies,
+    lig_filter), the source being either a byte range (infile, start, end)
+    or a block of undecoded lines, and appends them to the output file.
+    Returns the tuple (outfile, number of bytes appended). Runs in a worker
+    process."""
+    (source, outfile, type_frequencies, lig_filter) = shard
+    if isinstance(source, tuple):
+        (infile, start, end) = source
+        lines = read_lines(infile, start=start, end=end)
+    else:
+        lines = decode_lines(source)
+    size = file_size(outfile)
+    write_words(extract_words(lines, lig_filter), outfile, type_frequencies,
+                'ab')
+    return (outfile, file_size(outfile) - size)
+
+def process_shards(pool, infile, outfile, processes, type_frequencies,
+                   lig_filter):
+    """Processes the input file in parallel and returns the list of the parts
+    of the shard files written for it, as (shard file, size) tuples in order.
+    An uncompressed file is split into byte ranges, which the workers read on
+    their own. A compressed file can't be split like that: it is decompressed
+    here and its blocks are handed to the workers (processes blocks at a time),
+    the n-th block of every round being appended to the n-th shard file, s.t.
+    there are never more than processes shard files.
+    """
+    shard_files = [outfile + '.shard%03d' % n for n in range(processes)]
+    for shard_file in shard_files:
+        if os.path.exists(shard_file): os.remove(shard_file)
+    if not compression(infile):
+        shards = [((infile, s, e), shard_files[n], type_frequencies, lig_filter)
+                  for (n, (s, e)) in enumerate(shard_boundaries(infile, processes))]
+        return pool.map(process_shard, shards, 1)
+
+    parts = []
+    blocks = read_blocks(infile)
+    while True:
+        shards = [(block, shard_files[n], type_frequencies, lig_filter)
+                  for (n, block) in enumerate(islice(blocks, processes))]
+        if not shards: break
+        parts += pool.map(process_shard, shards, 1)
+    return parts
+
+def merge(infiles, outfile):
+    """Sums up the frequencies of the words in the given frequency files and
+    writes them to the output file, sorted by word. Each file may consist of
+    several runs sorted by word (one per block appended to it), so they are
+    counted again one file after the other, with only one of them open at a
+    time (cf. SpillingCounter)."""
+    counter = SpillingCounter()
+    for infile in infiles:
+        for (word, count) in read_frequencies(infile):
+            counter.add(word, count)
+    out_file = open_output(outfile)
+    write_frequencies(counter.items(), out_file)
+    out_file.close()
+    counter.close()
+
+def main(infile, outfile, processes=PROCESSES,
+         type_frequencies=TYPE_FREQUENCIES, lig_filter=LIG_FILTER,
+         output_compression=OUTPUT_COMPRESSION):
     """Takes an input file, reads it, filters all words we want to have
     and writes them to the output file.
     In particular all tags are filtered out and all words are considered which
     contain at least one letter.
+    If type_frequencies is set, every word is written only once, together
+    with its frequency. If lig_filter is set, only words which may contain
+    a ligature are written.
+    The input file may be compressed (cf. streams.COMPRESSIONS); the output file
+    is compressed if output_compression is given ('.gz', '.bz2' or '.xz',
+    which is appended to its name).
     """
     start = time()
-    print 'Extracting words from', infile, 'to', outfile
-    in_file = codecs.open(infile, 'r', 'utf-8')
-    out_file = codecs.open(outfile, 'wb', 'utf-8')
-    
-    for line in in_file:
-        line = re.sub('<[^>]*>', '', line).split()
-        for token in line:
-            if contains_letters(token):
-                out_file.write(token + '\n')
-    
-    in_file.close()
-    out_file.close()
+    print 'Extracting words from', infile, 'to', outfile + output_compression
+
+    if processes > 1:
+        pool = Pool(processes)
+        parts = process_shards(pool, infile, outfile, processes,
+                               type_frequencies, lig_filter)
+        pool.close()
+        pool.join()
+        print 'Used', processes, 'processes for', len(parts), 'shards'
+        shard_files = sorted(set([shard_file for (shard_file, size) in parts]))
+        if type_frequencies:
+            merge(shard_files, outfile + output_compression)
+        else:
+            concatenate_parts(parts, outfile + output_compression)
+        if not KEEP_SHARDS:
+            for shard_file in shard_files:
+                os.remove(shard_file)
+    else:
+        write_words(extract_words(read_lines(infile), lig_filter),
+                    outfile + output_compression, type_frequencies)
+
     print 'Runtime: ' + str(time()-start) + 's'
 
-main('corpus.raw', 'words/words.raw')
\ No newline at end of file
+if __name__ == '__main__':
+    main('corpus.raw', 'words/words.raw')
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+This module provides a counter for words which keeps only a bounded number of
+entries in memory. Whenever the limit is exceeded, the counts are written
+as a sorted run to a temporary file; in the end all runs are merged.
+
+Version: 0.1
+"""
+
+import os
+import codecs
+import heapq
+import tempfile
+
+"""
+Default number of distinct words kept in memory before spilling to disk
+"""
+MAX_ENTRIES = 1000000
+
+"""
+Separates a word from its frequency in the frequency files
+"""
+FREQUENCY_SEPARATOR = u'\t'
+
+
+def split_frequency(line):
+    """Takes a line (without newline) of the form 'word' or 'word<TAB>count'
+    and returns the tuple (word, count); count is None if there is none."""
+    if FREQUENCY_SEPARATOR in line:
+        (word, count) = line.rsplit(FREQUENCY_SEPARATOR, 1)
+        return (word, int(count))
+    return (line, None)
+
+
+def read_frequencies(infile):
+    """Yields the (word, count) tuples of a file written by write_frequencies."""
+    in_file = codecs.open(infile, 'r', 'utf-8')
+    for line in in_file:
+        yield split_frequency(line.rstrip(u'\n'))
+    in_file.close()
+
+
+def write_frequencies(items, out_file):
+    """Writes (word, count) tuples to the (opened) output file."""
+    for (word, count) in items:
+        out_file.write(word + FREQUENCY_SEPARATOR + unicode(count) + u'\n')
+
+
+def merge_frequencies(runs):
+    """Takes iterables of (word, count) tuples, each of them sorted by word,
+    and yields their k-way merge, sorted by word and with the counts of equal
+    words summed up."""
+    current = None
+    total = 0
+    for (word, count) in heapq.merge(*runs):
+        if word != current:
+            if current is not None:
+                yield (current, total)
+            (current, total) = (word, 0)
+        total += count
+    if current is not None:
+        yield (current, total)
+
+
+class SpillingCounter:
+    """Counts words, keeping at most max_entries distinct words in memory.
+    Whenever there are more, the counts are written to a temporary file
+    sorted by word (a 'run') and the memory is cleared."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, tmp_dir=None):
+        self.max_entries = max_entries
+        self.tmp_dir = tmp_dir
+        self.counts = {}
+        self.runs = []
+
+    def add(self, word, count=1):
+        self.counts[word] = self.counts.get(word, 0) + count
+        if len(self.counts) > self.max_entries:
+            self.spill()
+
+    def spill(self):
+        """Writes the counts in memory as a sorted run to a temporary file."""
+        if not self.counts:
+            return
+        (fd, run) = tempfile.mkstemp(prefix='spill.', dir=self.tmp_dir)
+        os.close(fd)
+        out_file = codecs.open(run, 'wb', 'utf-8')
+        write_frequencies(sorted(self.counts.iteritems()), out_file)
+        out_file.close()
+        self.runs.append(run)
+        self.counts = {}
+
+    def items(self):
+        """Yields all (word, count) tuples, sorted by word."""
+        in_memory = sorted(self.counts.iteritems())
+        if not self.runs:
+            return iter(in_memory)
+        return merge_frequencies([read_frequencies(run) for run in self.runs] +
+                                 [in_memory])
+
+    def close(self):
+        """Removes the temporary files."""
+        for run in self.runs:
+            os.remove(run)
+        self.runs = []
+        self.counts = {}
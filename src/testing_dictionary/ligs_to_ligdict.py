@@ -5,8 +5,13 @@ This module serves to merge the ligs files to the ligdict.
 Version: 0.1
 """
 
+import os
+import zlib
 import codecs
+import hashlib
 from time import time
+from external_sort import *
+from streams import find_input, read_lines
 
 """
 Definition of all input files that should be used
@@ -22,30 +27,147 @@ infiles = [
     base_folder + 'ligs.good.hyphen.end']
 
 """
-Reads the words from all input files to a set (for removing duplicates) and
-prints them to the given output file.
+Maximal number of distinct words kept in memory (the memory budget).
+If there are more, they are written as sorted runs to temporary files
+(in TMP_DIR, None meaning the default directory for temporary files),
+which are merged in the end (cf. external_sort.SpillingCounter)
+"""
+MAX_ENTRIES = 1000000
+TMP_DIR = None
+
+"""
+Average number of words per chunk of the ligdict (0 for no chunks).
+Besides the ligdict itself, its sorted words are written in chunks to the
+folder outfile + '.chunks/', each chunk named by the sha1 hash of its content,
+and their names (in order) to the file MANIFEST in that folder. A chunk ends
+after every word whose crc32 is divisible by CHUNK_WORDS, i.e. the chunk
+boundaries depend only on the words around them (and not on the number of
+words before them, as for chunks of fixed size). Adding or removing a word
+hence changes only the chunk containing it, all other chunks keep their names
+and bytes, so the SMOR analyses of them can be reused (cf. ligdict_to_smor).
+"""
+CHUNK_WORDS = 10000
+
+"""
+Writes the lines of the ligdict in content-defined chunks to a folder
+(cf. CHUNK_WORDS)
+"""
+class ChunkWriter:
+
+    """
+    Constructor
+    """
+    def __init__(self, folder, chunk_words=CHUNK_WORDS):
+        self.folder = folder
+        self.chunk_words = chunk_words
+        self.lines = []
+        self.chunks = []
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+    """
+    Adds an (encoded) line to the current chunk and writes the chunk if the
+    line ends it
+    """
+    def add(self, line):
+        self.lines.append(line)
+        if (zlib.crc32(line) & 0xffffffff) % self.chunk_words == 0:
+            self.write_chunk()
+
+    """
+    Writes the current chunk (unless a chunk with its content exists already)
+    """
+    def write_chunk(self):
+        if not self.lines: return
+        content = ''.join(self.lines)
+        name = hashlib.sha1(content).hexdigest()
+        path = os.path.join(self.folder, name)
+        if not os.path.exists(path):
+            chunk_file = open(path + '.tmp', 'wb')
+            chunk_file.write(content)
+            chunk_file.close()
+            os.rename(path + '.tmp', path)
+        self.chunks.append(name)
+        self.lines = []
+
+    """
+    Writes the last chunk and the MANIFEST and removes all chunks of previous
+    runs which are not part of the ligdict anymore
+    """
+    def close(self):
+        self.write_chunk()
+        manifest = open(os.path.join(self.folder, 'MANIFEST'), 'wb')
+        for name in self.chunks:
+            manifest.write(name + '\n')
+        manifest.close()
+        for name in os.listdir(self.folder):
+            if name != 'MANIFEST' and name not in self.chunks:
+                os.remove(os.path.join(self.folder, name))
+
+"""
+Writes the words of the counter (cf. external_sort.SpillingCounter) sorted
+to the given output file (and in chunks, if chunk_words is not 0), as well as
+their frequencies to outfile + '.freq' if frequencies is set.
+The output will be encoded in latin-1, since SMOR (which is the next step)
+cannot handle utf-8.
+"""
+def write_ligdict(counter, outfile, frequencies=False, chunk_words=CHUNK_WORDS):
+    out_file = open(outfile, 'wb')
+    if frequencies:
+        freq_file = codecs.open(outfile + '.freq', 'wb', 'utf-8')
+    if chunk_words:
+        chunk_writer = ChunkWriter(outfile + '.chunks', chunk_words)
+    for (word, count) in counter.items():
+        try:
+            line = (word + '\n').encode('latin-1')
+            out_file.write(line)
+            if chunk_words: chunk_writer.add(line)
+        except Exception as e:
+            print ('WARNING: Couldn\'t write "' + word +
+                   '" to file "' + out_file.name + '"')
+        if frequencies:
+            write_frequencies([(word, count)], freq_file)
+    out_file.close()
+    if chunk_words:
+        chunk_writer.close()
+        print 'Wrote', len(chunk_writer.chunks), 'chunks to', chunk_writer.folder
+    if frequencies:
+        freq_file.close()
+
+    if counter.runs:
+        print 'Merged', len(counter.runs), 'runs spilled to temporary files'
+
+"""
+Reads the words from all input files, removes duplicates and prints them
+sorted to the given output file. At most max_entries distinct words are kept
+in memory, the rest is sorted and merged externally.
+If chunk_words is not 0, the ligdict is written in chunks as well
+(cf. CHUNK_WORDS).
 
 The output will be encoded in latin-1, since SMOR (which is the next step)
 cannot handle utf-8.
+The input files may be compressed (e.g. 'ligs/ligs.good.normal.gz').
+
+If the input files contain frequencies ('word<TAB>count'), only the words are
+written to the output file; the frequencies are summed up per word and
+written to outfile + '.freq' (sorted by word).
 """
-def main(outfile):
+def main(outfile, max_entries=MAX_ENTRIES, chunk_words=CHUNK_WORDS):
     start = time()
     
-    output = set([])
+    counter = SpillingCounter(max_entries, TMP_DIR)
+    frequencies = False
     for infile in infiles:
-        in_file = codecs.open(infile, 'r', 'utf-8')
-        for line in in_file:
-            output.add(line)
-        in_file.close()
+        for line in read_lines(find_input(infile)):
+            (word, count) = split_frequency(line.rstrip('\n'))
+            if count is None: count = 1
+            else: frequencies = True
+            counter.add(word, count)
 
-    out_file = codecs.open(outfile, 'wb', 'latin-1')
-    for elem in output:
-        try:
-            out_file.write(elem)
-        except Exception as e:
-            print ('WARNING: Couldn\'t write "' + elem.rstrip() +
-                   '" to file "' + out_file.name + '"')
+    write_ligdict(counter, outfile, frequencies, chunk_words)
+    counter.close()
 
     print 'Runtime: ' + str(time()-start) + 's'
 
-main('ligdict')
+if __name__ == '__main__':
+    main('ligdict')
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+This module serves to run corpus_to_words, words_to_ligs and ligs_to_ligdict
+in a single process: the words are passed between the stages through
+generators, instead of writing them to words/words.raw and ligs/* and reading
+and decoding them again in the next stage.
+The words are counted right away (as with corpus_to_words.TYPE_FREQUENCIES),
+so every distinct word is classified only once and the frequencies are
+written to ligdict.freq as well.
+The intermediate files are only written if TAPS is set (e.g. for debugging).
+
+Version: 0.1
+"""
+
+import os
+from time import time
+
+from external_sort import *
+from streams import *
+import corpus_to_words
+import words_to_ligs
+import ligs_to_ligdict
+
+"""
+Whether the intermediate files (WORDS_FILE and the files of words_to_ligs)
+should be written as well
+"""
+TAPS = False
+WORDS_FILE = 'words/words.raw'
+
+"""
+The categories of words_to_ligs the ligdict consists of
+(cf. ligs_to_ligdict.infiles)
+"""
+ligdict_categories = set([os.path.basename(infile)
+                          for infile in ligs_to_ligdict.infiles])
+
+
+def main(infile, outfile, taps=TAPS, lig_filter=corpus_to_words.LIG_FILTER):
+    """Reads the corpus and writes the ligdict (and its frequencies), as the
+    three stages would do one after another."""
+    start = time()
+    print 'Extracting words from', infile, 'to', outfile
+
+    words = SpillingCounter(tmp_dir=ligs_to_ligdict.TMP_DIR)
+    for word in corpus_to_words.extract_words(read_lines(find_input(infile)),
+                                              lig_filter):
+        words.add(word)
+
+    if taps:
+        words_file = open_output(WORDS_FILE)
+        files = words_to_ligs.open_out_files()
+    ligdict = SpillingCounter(ligs_to_ligdict.MAX_ENTRIES, ligs_to_ligdict.TMP_DIR)
+    for (word, count) in words.items():
+        freq = FREQUENCY_SEPARATOR + unicode(count)
+        if taps:
+            words_file.write(word + freq + '\n')
+        for (category, text) in words_to_ligs.classify(word):
+            if taps:
+                words_to_ligs.write(text + freq, files[category])
+            if category in ligdict_categories:
+                ligdict.add(text, count)
+    words.close()
+    if taps:
+        words_file.close()
+        for f in files.values():
+            f.close()
+
+    ligs_to_ligdict.write_ligdict(ligdict, outfile, True,
+                                  ligs_to_ligdict.CHUNK_WORDS)
+    ligdict.close()
+
+    print 'Runtime: ' + str(time()-start) + 's'
+
+if __name__ == '__main__':
+    main('corpus.raw', 'ligdict')
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+This module serves to read and write (possibly compressed) utf-8 text files.
+The compression is determined by the file extension ('.gz', '.bz2', '.xz').
+It also provides the splitting of (uncompressed) files into newline-aligned
+byte ranges for parallel processing and the concatenation of the results
+(whole files, or the parts appended to a few files, cf. concatenate_parts).
+
+Version: 0.1
+"""
+
+import os
+import bz2
+import gzip
+import shutil
+import codecs
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None # .xz files need the backports.lzma package (Python 2)
+
+"""
+Number of bytes read (and decoded) at once
+"""
+BLOCK_SIZE = 1 << 24
+
+"""
+Supported compressions (file extension -> function opening a binary file)
+"""
+def open_xz(path, mode):
+    if lzma is None:
+        raise Exception('Reading/writing .xz files requires the ' +
+                        'backports.lzma package: ' + path)
+    return lzma.LZMAFile(path, mode)
+
+COMPRESSIONS = {'.gz':  gzip.open,
+                '.bz2': bz2.BZ2File,
+                '.xz':  open_xz}
+
+
+def compression(path):
+    """Returns the compression extension of the path ('' if uncompressed)."""
+    ext = os.path.splitext(path)[1]
+    if ext in COMPRESSIONS: return ext
+    return ''
+
+
+def open_binary(path, mode='rb'):
+    """Opens a (possibly compressed) file in binary mode."""
+    ext = compression(path)
+    if ext: return COMPRESSIONS[ext](path, mode)
+    return open(path, mode)
+
+
+def open_output(path, mode='wb'):
+    """Opens a (possibly compressed) file for writing unicode to it
+    (or, with mode 'ab', appending to it)."""
+    return codecs.getwriter('utf-8')(open_binary(path, mode))
+
+
+def file_size(path):
+    """Returns the size of the file in bytes (0 if it doesn't exist)."""
+    if os.path.exists(path): return os.path.getsize(path)
+    return 0
+
+
+def find_input(path):
+    """Returns the path if the file exists, or else the path of a compressed
+    version of it (path + '.gz', ...) if that one exists."""
+    if os.path.exists(path): return path
+    for ext in sorted(COMPRESSIONS):
+        if os.path.exists(path + ext): return path + ext
+    return path
+
+
+def read_blocks(path, block_size=None, start=0, end=None):
+    """Yields blocks of (undecoded) complete lines of a file, each of them
+    about block_size (default: BLOCK_SIZE) bytes long. If the file is not
+    compressed, only the byte range [start, end) is read, start being the
+    beginning of a line."""
+    if block_size is None: block_size = BLOCK_SIZE
+    in_file = open_binary(path)
+    if start: in_file.seek(start)
+    pos = start
+    while end is None or pos < end:
+        size = block_size
+        if end is not None: size = min(size, end - pos)
+        block = in_file.read(size)
+        if not block: break
+        if not block.endswith('\n'):
+            block += in_file.readline() # complete the last line
+        pos += len(block)
+        yield block
+    in_file.close()
+
+
+def decode_lines(block):
+    """Decodes a block of lines and returns the lines, split the same way
+    codecs.open would split them."""
+    return block.decode('utf-8').splitlines(True)
+
+
+def read_lines(path, block_size=None, start=0, end=None):
+    """Yields the (unicode) lines of a (possibly compressed) utf-8 file,
+    decoding large blocks at once instead of single lines."""
+    for block in read_blocks(path, block_size, start, end):
+        for line in decode_lines(block):
+            yield line
+
+
+def shard_boundaries(infile, shards, end=None):
+    """Splits the file (or its first end bytes, end being the beginning of a
+    line) into (at most) the given number of byte ranges, each of them
+    starting at the beginning of a line.
+    Returns a list of (start, end) tuples."""
+    size = os.path.getsize(infile)
+    if end is not None: size = min(size, end)
+    boundaries = [0]
+    in_file = open(infile, 'rb')
+    for n in range(1, shards):
+        pos = max(size * n / shards, boundaries[-1])
+        if pos >= size: break
+        if pos > 0:
+            # if the byte before pos is a newline, pos is a line start already
+            in_file.seek(pos - 1)
+            in_file.readline()
+            pos = in_file.tell()
+        if pos > boundaries[-1] and pos < size:
+            boundaries.append(pos)
+    in_file.close()
+    boundaries.append(size)
+    return zip(boundaries[:-1], boundaries[1:])
+
+
+def concatenate(infiles, outfile):
+    """Concatenates the given files to the output file."""
+    out_file = open_binary(outfile, 'wb')
+    for infile in infiles:
+        in_file = open(infile, 'rb')
+        shutil.copyfileobj(in_file, out_file, 1 << 20)
+        in_file.close()
+    out_file.close()
+
+
+def concatenate_parts(parts, outfile):
+    """Concatenates parts of (uncompressed) files to the output file, given as
+    a list of (file, size) tuples in order. The parts of a file follow each
+    other in it, so every file is opened once and read on from part to part
+    (e.g. if the parallel workers append the results of several blocks to
+    their own file)."""
+    out_file = open_binary(outfile, 'wb')
+    in_files = {}
+    for (infile, size) in parts:
+        if infile not in in_files: in_files[infile] = open(infile, 'rb')
+        in_file = in_files[infile]
+        while size > 0:
+            data = in_file.read(min(size, 1 << 20))
+            if not data:
+                raise Exception('Part missing in file ' + infile)
+            out_file.write(data)
+            size -= len(data)
+    for in_file in in_files.values():
+        in_file.close()
+    out_file.close()
@@ -7,8 +7,13 @@ Version: 0.1
 """
 
 import re, codecs
+import os
 import unicodedata
+from itertools import islice
+from multiprocessing import Pool
 from Ligatures import *
+from external_sort import split_frequency, FREQUENCY_SEPARATOR
+from streams import *
 from time import time
 
 
@@ -17,32 +22,48 @@ Definition of the output files
 --------------------------------------------------------------------------"""
 base_folder = 'ligs/'
 
-good_normal            = codecs.open(base_folder +
-                    'ligs.good.normal', 'wb', 'utf-8')
-good_startswith_hyphen = codecs.open(base_folder +
-                    'ligs.good.hyphen.startsWithHyphen', 'wb', 'utf-8')
-good_hyphen_beginnings = codecs.open(base_folder +
-                    'ligs.good.hyphen.beginnings', 'wb', 'utf-8')
-good_hyphen_end        = codecs.open(base_folder +
-                    'ligs.good.hyphen.end', 'wb', 'utf-8')
-good_innen             = codecs.open(base_folder +
-                    'ligs.good.Innen', 'wb', 'utf-8')
-good_laws              = codecs.open(base_folder +
-                    'ligs.good.laws', 'wb', 'utf-8')
+"""
+Compression of the output files ('', '.gz', '.bz2' or '.xz'); the extension
+is appended to their names
+"""
+OUTPUT_COMPRESSION = ''
+
+"""
+Number of processes used for classifying the words.
+If it is greater than 1, the input file is split into chunks (newline-aligned
+byte ranges, or blocks of lines if it is compressed) which are classified in
+parallel, each of them writing to one of processes shards of every output file
+(e.g. 'ligs.good.normal.shard000'; the blocks of a compressed file are
+appended to them in turn). Afterwards the shards of each output file
+are concatenated in order, so the result is identical to the one of a
+sequential run.
+"""
+PROCESSES = 1
+
+"""
+Whether the shard files should be kept after they have been concatenated
+"""
+KEEP_SHARDS = False
+
+"""
+Names of the output files, which are also used as the categories the words
+are sorted into (cf. classify)
+"""
+good_normal            = 'ligs.good.normal'
+good_startswith_hyphen = 'ligs.good.hyphen.startsWithHyphen'
+good_hyphen_beginnings = 'ligs.good.hyphen.beginnings'
+good_hyphen_end        = 'ligs.good.hyphen.end'
+good_innen             = 'ligs.good.Innen'
+good_laws              = 'ligs.good.laws'
 
-review_lig_across_punctuation  = codecs.open(base_folder +
-                    'ligs.review.ligAcrossPunctuation', 'wb', 'utf-8')
-review_punctuation             = codecs.open(base_folder +
-                    'ligs.review.punctuation', 'wb', 'utf-8')
+review_lig_across_punctuation  = 'ligs.review.ligAcrossPunctuation'
+review_punctuation             = 'ligs.review.punctuation'
 
-interesting_allcaps            = codecs.open(base_folder +
-                    'ligs.interesting.allcaps', 'wb', 'utf-8')
-interesting_single_letter_abbr = codecs.open(base_folder +
-                    'ligs.interesting.singleLetterAbbr', 'wb', 'utf-8')
+interesting_allcaps            = 'ligs.interesting.allcaps'
+interesting_single_letter_abbr = 'ligs.interesting.singleLetterAbbr'
 
 
-bad_camel                   = codecs.open(base_folder +
-                    'ligs.bad.camel', 'wb', 'utf-8')
+bad_camel                   = 'ligs.bad.camel'
 
 """
 List of all output files
@@ -54,6 +75,17 @@ out_files = [good_normal, good_startswith_hyphen,
              interesting_allcaps, interesting_single_letter_abbr,
              bad_camel]
 
+"""
+Opens all output files and returns a dictionary from their names to them
+(the shards are written uncompressed and appended to, cf. process_chunk)
+"""
+def open_out_files(folder=base_folder, suffix='', output_compression=None,
+                   mode='wb'):
+    if output_compression is None: output_compression = OUTPUT_COMPRESSION
+    return dict([(name, open_output(folder + name + suffix + output_compression,
+                                    mode))
+                 for name in out_files])
+
 """
 Takes a word and writes it to the specified output file
 """
@@ -76,40 +108,41 @@ All (combinations of) symbols which are considered as hyphens.
 These are different versions of hyphens, each to the left xor right concatenated
 with one of the symbols {",',`,´,<<,>>}
 """
-hyphen_equivalent = ([u'\u00AD'] + [u'\u002D'] + [u'\u2010'] + [u'\u2212'] +
-                     [u'\u2011'] + 
-                    flatten([[u'\u00AD'+q, q+u'\u00AD', # hyphen-minus
-                              u'\u002D'+q, q+u'\u002D', # minus sign
-                              u'\u2010'+q, q+u'\u2010', # hyphen
-                              u'\u2011'+q, q+u'\u2011', # non-breaking hyphen
-                              u'\u2012'+q, q+u'\u2012'] # figure dash
-                                            for q in [u'\u0022', # "
-                                                      u'\u0027', # '
-                                                      u'\u0060', # `
-                                                      u'\u00AB', # «
-                                                      u'\u00BB', # »
-                                                      u'\u00B4', # ´
-                                                      u'\u2018', # LEFT SINGLE QUOTATION MARK
-                                                      u'\u2019', # RIGHT SINGLE QUOTATION MARK
-                                                      u'\u201A', # SINGLE LOW-9 QUOTATION MARK
-                                                      u'\u2039', # SINGLE LEFT-POINTING ANGLE QUOTATION MARK
-                                                      u'\u203A', # SINGLE RIGHT-POINTING ANGLE QUOTATION MARK
-                                                      u'\u201C', # LEFT DOUBLE QUOTATION MARK
-                                                      u'\u201D', # RIGHT DOUBLE QUOTATION MARK
-                                                      u'\u201E']])) # DOUBLE LOW-9 QUOTATION MARK
-                                                      
-
-"""
-A regular expression built up of hyphen equivalent.
-"""
-hyphen_regex = re.compile('|'.join(hyphen_equivalent))
-
-"""
-Takes a word and splits it at hyphens (using hyphen-regex)
-and returns a list of tokens.
+single_hyphens = [u'\u00AD', # soft hyphen
+                  u'\u002D', # hyphen-minus
+                  u'\u2010', # hyphen
+                  u'\u2212', # minus sign
+                  u'\u2011'] # non-breaking hyphen
+quoted_hyphens = [u'\u00AD', # soft hyphen
+                  u'\u002D', # hyphen-minus
+                  u'\u2010', # hyphen
+                  u'\u2011', # non-breaking hyphen
+                  u'\u2012'] # figure dash
+quotes = [u'\u0022', # "
+          u'\u0027', # '
+          u'\u0060', # `
+          u'\u00AB', # «
+          u'\u00BB', # »
+          u'\u00B4', # ´
+          u'\u2018', # LEFT SINGLE QUOTATION MARK
+          u'\u2019', # RIGHT SINGLE QUOTATION MARK
+          u'\u201A', # SINGLE LOW-9 QUOTATION MARK
+          u'\u2039', # SINGLE LEFT-POINTING ANGLE QUOTATION MARK
+          u'\u203A', # SINGLE RIGHT-POINTING ANGLE QUOTATION MARK
+          u'\u201C', # LEFT DOUBLE QUOTATION MARK
+          u'\u201D', # RIGHT DOUBLE QUOTATION MARK
+          u'\u201E'] # DOUBLE LOW-9 QUOTATION MARK
+
+hyphen_equivalent = (single_hyphens +
+                     flatten([flatten([[h + q, q + h] for h in quoted_hyphens])
+                              for q in quotes]))
+
+"""
+Takes a word and splits it at hyphens (hyphen equivalents)
+and returns a list of tokens (cf. hyphen_tokens).
 """
 def split_at_hyphens(word):
-    return re.split(hyphen_regex, word)
+    return hyphen_tokens(word)[0]
 
 """
 Test whether a unicode character is letter, lowercase letter, uppercase leter
@@ -128,18 +161,14 @@ def remove_punctuation(word):
 Returns true if the given word contains a ligature
 """
 def contains_any_lig(word):
-    for lig in LIGS:
-        if lig.glyph in word: return True
-    return False
+    return LIG_MATCHER.contains_any(word)
 
 """
 Returns true if the given word contains a ligature,
 ignoring the case of word and ligatures
 """
 def contains_any_lig_non_case_sensitive(word):
-    for lig in LIGS:
-        if lig.glyph.lower() in word.lower(): return True
-    return False
+    return LIG_MATCHER_IGNORE_CASE.contains_any(word)
 
 """
 Returns true if the given word contains only letters
@@ -189,9 +218,9 @@ def camel_case(word):
 Returns true if the given word ends with 'In' or contains 'Innen'
 and the word without the letter combintion 'In' is titlecase
 """
+innen_regex = re.compile('\\w*(Innen\\w*|In)$', re.UNICODE)
 def endswith_innen(word):
-    pattern = re.compile('\\w*(Innen\\w*|In)$', re.UNICODE)
-    return re.match(pattern, word) != None and title_case(re.sub('In','',word))
+    return re.match(innen_regex, word) != None and title_case(re.sub('In','',word))
 
 """
 Returns true if the given word seems to be a law,
@@ -205,26 +234,164 @@ def is_law(word):
 Returns true if the given word contains no other punctuation than hyphens
 """
 def only_hyphens(word):
-    pattern = re.compile(u'^(\\w|' + '|'.join(hyphen_equivalent) + u')*$',
-                         re.UNICODE)
-    return re.match(pattern, word) != None   # len(remove_punctuation(word)) == len(''.join(split_at_hyphens(word)))
+    return hyphen_tokens(word)[1]
 
 """
 Returns true if the given word is a single letter abbreviation
 """
+single_letter_abbr_regex = re.compile('((\\w\\.)+\w?$)', re.UNICODE) # -> 'X.y.Z' | 'X.y.Z.'
 def single_letter_abbr(word):
-    pattern = re.compile('((\\w\\.)+\w?$)', re.UNICODE) # -> 'X.y.Z' | 'X.y.Z.'
-    return re.match(pattern, word) != None 
+    return re.match(single_letter_abbr_regex, word) != None 
 
 
 
+"""--------------------------------------------------------------------------
+Classification of words in a single pass
+--------------------------------------------------------------------------"""
+
+"""
+Returns the class symbol of a unicode character:
+ - 'u', 'l' and 'a' for uppercase, lowercase and other letters
+ - '0' for all other characters matching \\w (digits, '_', ...)
+ - '-' for hyphens which are hyphen equivalents on their own and together
+   with a quote, '=' for those only on their own (minus sign) and '~' for
+   those only together with a quote (figure dash)
+ - '"' for quotes, '.' for the full stop and ' ' for everything else
+"""
+word_char_regex = re.compile('\\w', re.UNICODE)
+def char_class(char):
+    if char in single_hyphens:
+        if char in quoted_hyphens: return u'-'
+        return u'='
+    if char in quoted_hyphens: return u'~'
+    if char in quotes: return u'"'
+    if char == u'.': return u'.'
+    category = unicodedata.category(char)
+    if category == 'Lu': return u'u'
+    if category == 'Ll': return u'l'
+    if category[0] == 'L': return u'a'
+    if word_char_regex.match(char): return u'0'
+    return u' '
+
+"""
+Table from (the code of) a character to its class symbol, for translating
+a word to the string of its character classes (word.translate(char_classes)).
+The table is filled on demand.
+"""
+class CharClasses(dict):
+    def __missing__(self, code):
+        self[code] = char_class(unichr(code))
+        return self[code]
+
+char_classes = CharClasses()
+for code in range(256):
+    char_classes[code]
+
+"""
+only_hyphens on the class string of a word
+"""
+only_hyphens_classes_regex = re.compile(u'(?:[ula0]|[-=]|[-~]"|"[-~])*\\Z')
+
+"""
+The hyphen equivalents on the class string of a word, as they are found when
+scanning the word from left to right: a hyphen on its own is taken as it is
+(even if a quote follows), a figure dash only together with a following quote
+and a quote together with a following hyphen or figure dash
+"""
+hyphen_classes_regex = re.compile(u'[-=]|~"|"[-~]')
+
+"""
+Takes a word (and optionally its class string) and returns the tuple
+(tokens, only_hyphens), tokens being the parts of the word between its hyphen
+equivalents and only_hyphens being true if the word contains no other
+punctuation than hyphens. The word is translated to its class string once,
+which is then matched by compiled character class expressions instead of
+alternations of all hyphen equivalents.
+Note that only_hyphens allows any split of the word into letters and hyphen
+equivalents (e.g. 'a-"b', with the hyphen taken together with the quote),
+while the tokens are split from left to right (giving 'a' and '"b').
+"""
+def hyphen_tokens(word, classes=None):
+    if classes is None: classes = word.translate(char_classes)
+    tokens = []
+    start = 0
+    for match in hyphen_classes_regex.finditer(classes):
+        tokens.append(word[start:match.start()])
+        start = match.end()
+    tokens.append(word[start:])
+    return (tokens, only_hyphens_classes_regex.match(classes) is not None)
+
+"""
+First letters of all ligatures (a word without any of them can't contain a
+ligature, not even across punctuation)
+"""
+lig_initials = set([lig.glyph[0] for lig in LIGS])
+
+"""
+Takes a word and returns a list of (output file, line) tuples, i.e. the
+lines to be written for the word (cf. main).
+The word is scanned only once (by translating it to the string of its
+character classes); all properties needed (single_letter_abbr, all_upper,
+only_alpha, camel_case, endswith_innen, is_law, only_hyphens) are then
+determined from this class string.
+"""
+def classify(word):
+    classes = word.translate(char_classes)
+    n = len(classes)
+    routes = []
+    # single_letter_abbr: 'X.y.Z' | 'X.y.Z.'
+    if n > 1 and classes[1::2] == u'.' * (n // 2) and classes[0::2].isalnum():
+        routes.append((interesting_single_letter_abbr, word))
+    # all_upper
+    if u'l' not in classes:
+        routes.append((interesting_allcaps, word))
+    if contains_any_lig(word):
+        # only_alpha
+        if classes.isalpha():
+            rest = classes[1:]
+            # camel_case
+            if classes[0] == u'l': camel = u'u' in rest
+            else: camel = u'u' in rest and u'l' in rest
+            if not camel:
+                routes.append((good_normal, word))
+            elif ((u'Innen' in word or word.endswith(u'In')) and
+                    title_classes(word.replace(u'In', u''))):
+                routes.append((good_innen, word))
+            elif n > 2 and classes[0] == u'u' and word[-1] in u'GV':
+                routes.append((good_laws, word))
+            else:
+                routes.append((bad_camel, word))
+        elif only_hyphens_classes_regex.match(classes):
+            routes += hyphen_filter(word, classes)
+        else:
+            routes.append((review_punctuation, word))
+    elif not classes.isalpha():
+        for initial in lig_initials:
+            if initial in word: break
+        else:
+            return routes
+        letters = u''.join([char for (char, c) in zip(word, classes)
+                            if c in u'ula'])
+        if contains_any_lig(letters):
+            routes.append((review_lig_across_punctuation, word))
+    return routes
+
+"""
+title_case on the class string of a word
+"""
+def title_classes(word):
+    classes = word.translate(char_classes)
+    return len(classes) > 0 and classes[0] != u'l' and u'u' not in classes[1:]
+
+
 """--------------------------------------------------------------------------
 Main functions
 --------------------------------------------------------------------------"""
 
 """
-Takes a word for which [[only_hyphens(word) == True]] and processes the word
-finally writing it or parts of it to some output file.
+Takes a word for which [[only_hyphens(word) == True]] (and optionally its
+class string) and processes the word returning the list of
+(output file, line) tuples for it or parts of it.
  - if the word contains only one hyphen and this hyphen is at the beginning,
      the word is written into good_startswith_hyphen
  - otherwise the last token including hyphen is written to good_hyphen_end,
@@ -234,64 +401,126 @@ finally writing it or parts of it to some output file.
 For more detailed information about these decisions please take a look
 at our documentation.
 """
-def hyphen_filter(word):
-    if (word[0] in hyphen_equivalent and re.match(hyphen_regex, word[1:]) == None
+def hyphen_filter(word, classes=None):
+    if classes is None: classes = word.translate(char_classes)
+    # a single hyphen at the beginning (not followed by a hyphen equivalent)
+    if (classes[0] in u'-=' and hyphen_classes_regex.match(classes, 1) == None
         and contains_any_lig(word[1:])):
-        write('-' + word[1:], good_startswith_hyphen)
-        return
+        return [(good_startswith_hyphen, '-' + word[1:])]
 
-    tokens = split_at_hyphens(word)
+    routes = []
+    tokens = hyphen_tokens(word, classes)[0]
     if tokens[0] == '': start = 1 # the word started with a hyphen
     else: start = 0
     for t in tokens[start:-1]:
         if contains_any_lig(t):
-            write(t, good_hyphen_beginnings)
+            routes.append((good_hyphen_beginnings, t))
     if contains_any_lig(tokens[-1]):
-        write('-' + tokens[-1], good_hyphen_end)
-        
+        routes.append((good_hyphen_end, '-' + tokens[-1]))
+    return routes
+
+
+"""
+Classifies the (unicode) lines of the input file and writes them
+to the given (opened) output files
+"""
+def classify_lines(lines, files):
+    for line in lines:
+        (word, count) = split_frequency(line.rstrip())
+        if count is None: freq = ''
+        else: freq = FREQUENCY_SEPARATOR + unicode(count)
+        for (out_file, text) in classify(word):
+            write(text + freq, files[out_file])
+
+"""
+Classifies a chunk (source, suffix) of the input file, the source being
+either a byte range (infile, start, end) or a block of undecoded lines,
+and appends it to the shards of the output files with the given suffix.
+Returns the tuple (suffix, dictionary from the names of the output files to
+the number of bytes appended to their shards). Runs in a worker process.
+"""
+def process_chunk(chunk):
+    (source, suffix) = chunk
+    if isinstance(source, tuple):
+        (infile, start, end) = source
+        lines = read_lines(infile, start=start, end=end)
+    else:
+        lines = decode_lines(source)
+    sizes = dict([(name, file_size(base_folder + name + suffix))
+                  for name in out_files])
+    files = open_out_files(suffix=suffix, output_compression='', mode='ab')
+    classify_lines(lines, files)
+    for f in files.values():
+        f.close()
+    return (suffix, dict([(name, file_size(base_folder + name + suffix) - size)
+                          for (name, size) in sizes.items()]))
+
+"""
+Classifies the input file in parallel and returns the list of the results of
+process_chunk (in the order of the chunks). An uncompressed file is split
+into byte ranges, which the workers read on their own; a compressed file is
+decompressed here and its blocks are handed to the workers (processes blocks
+at a time), the n-th block of every round being appended to the n-th shards,
+s.t. there are never more than processes shards of an output file.
+"""
+def process_chunks(pool, infile, processes):
+    suffixes = ['.shard%03d' % n for n in range(processes)]
+    for name in out_files:
+        for suffix in suffixes:
+            if os.path.exists(base_folder + name + suffix):
+                os.remove(base_folder + name + suffix)
+    if not compression(infile):
+        chunks = [((infile, s, e), suffixes[n])
+                  for (n, (s, e)) in enumerate(shard_boundaries(infile, processes))]
+        return pool.map(process_chunk, chunks, 1)
+
+    results = []
+    blocks = read_blocks(infile)
+    while True:
+        chunks = [(block, suffixes[n])
+                  for (n, block) in enumerate(islice(blocks, processes))]
+        if not chunks: break
+        results += pool.map(process_chunk, chunks, 1)
+    return results
 
 """
 Takes a file (output file 'words' from the previous stop) sorts those words
-into the output files defined above.
+into the output files defined above (cf. classify).
+The input file may be compressed (e.g. 'words/words.raw.gz').
+If processes is greater than 1, the words are classified in parallel
+(cf. PROCESSES).
+The lines of the input file may also be of the form 'word<TAB>count'
+(cf. corpus_to_words.TYPE_FREQUENCIES); the frequencies are then carried
+along to the output files.
 For more detailed information please take a look at our documentation.
 """
-def main(infile):    
+def main(infile, processes=PROCESSES):    
     start = time()
     print ('Filtering words with ligatures: ' +
                ','.join([str(lig) for lig in LIGS]))
-
-    in_file = codecs.open(infile, 'r', 'utf-8')
-    # out_files have already been opened
-    
-    for line in in_file:
-        word = line.rstrip()
-        if single_letter_abbr(word): # just because it is interesting
-            write(word, interesting_single_letter_abbr)
-        if all_upper(word):
-            write(word, interesting_allcaps)
-        if contains_any_lig(word):
-            if only_alpha(word):
-                if camel_case(word):
-                    if endswith_innen(word):
-                        write(word, good_innen)
-                    elif is_law(word):
-                        write(word, good_laws)
-                    else:
-                        write(word, bad_camel)
-                else:
-                    write(word, good_normal)
-            else:
-                if only_hyphens(word):
-                    hyphen_filter(word)
-                else:
-                    write(word, review_punctuation)
-        elif contains_any_lig(remove_punctuation(word)):
-            write(word, review_lig_across_punctuation)
-
-    for f in out_files:
-        f.close()
+    infile = find_input(infile)
+
+    if processes > 1:
+        pool = Pool(processes)
+        results = process_chunks(pool, infile, processes)
+        pool.close()
+        pool.join()
+        print 'Used', processes, 'processes for', len(results), 'chunks'
+        for name in out_files:
+            parts = [(base_folder + name + suffix, sizes[name])
+                     for (suffix, sizes) in results]
+            concatenate_parts(parts, base_folder + name + OUTPUT_COMPRESSION)
+            if not KEEP_SHARDS:
+                for shard_file in sorted(set([f for (f, size) in parts])):
+                    os.remove(shard_file)
+    else:
+        files = open_out_files()
+        classify_lines(read_lines(infile), files)
+        for f in files.values():
+            f.close()
         
     print 'Runtime: ' + str(time()-start) + 's'
 
 
-main('words/words.raw')
+if __name__ == '__main__':
+    main('words/words.raw')
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+This module serves to compare words_to_ligs.classify with the original
+classification of words_to_ligs (one function per property of the word):
+it checks that both route every word to the same output files and measures
+their throughput. The original hyphen handling (regular expressions built up
+of all hyphen equivalents) is compared with hyphen_tokens as well.
+
+Version: 0.1
+"""
+
+from time import time
+from itertools import islice
+from words_to_ligs import *
+
+"""
+Maximal number of words read from the input file
+"""
+MAX_WORDS = 1000000
+
+
+"""
+The original regular expressions built up of the hyphen equivalents
+"""
+hyphen_regex = re.compile('|'.join(hyphen_equivalent))
+only_hyphens_regex = re.compile(u'^(\\w|' + '|'.join(hyphen_equivalent) + u')*$',
+                                re.UNICODE)
+
+
+def hyphen_tokens_reference(word):
+    """The original split_at_hyphens and only_hyphens."""
+    return (re.split(hyphen_regex, word),
+            re.match(only_hyphens_regex, word) != None)
+
+
+def hyphen_filter_reference(word):
+    """The original hyphen_filter."""
+    if (word[0] in hyphen_equivalent and re.match(hyphen_regex, word[1:]) == None
+        and contains_any_lig(word[1:])):
+        return [(good_startswith_hyphen, '-' + word[1:])]
+
+    routes = []
+    tokens = re.split(hyphen_regex, word)
+    if tokens[0] == '': start = 1 # the word started with a hyphen
+    else: start = 0
+    for t in tokens[start:-1]:
+        if contains_any_lig(t):
+            routes.append((good_hyphen_beginnings, t))
+    if contains_any_lig(tokens[-1]):
+        routes.append((good_hyphen_end, '-' + tokens[-1]))
+    return routes
+
+
+def classify_reference(word):
+    """The original classification of words_to_ligs.main, returning the list
+    of (output file, line) tuples instead of writing them."""
+    routes = []
+    if single_letter_abbr(word): # just because it is interesting
+        routes.append((interesting_single_letter_abbr, word))
+    if all_upper(word):
+        routes.append((interesting_allcaps, word))
+    if contains_any_lig(word):
+        if only_alpha(word):
+            if camel_case(word):
+                if endswith_innen(word):
+                    routes.append((good_innen, word))
+                elif is_law(word):
+                    routes.append((good_laws, word))
+                else:
+                    routes.append((bad_camel, word))
+            else:
+                routes.append((good_normal, word))
+        else:
+            if re.match(only_hyphens_regex, word) != None:
+                routes += hyphen_filter_reference(word)
+            else:
+                routes.append((review_punctuation, word))
+    elif contains_any_lig(remove_punctuation(word)):
+        routes.append((review_lig_across_punctuation, word))
+    return routes
+
+
+def benchmark(function, words):
+    """Returns the runtime of applying the function to all words."""
+    start = time()
+    for word in words:
+        function(word)
+    return time() - start
+
+
+def main(infile):
+    words = [split_frequency(line.rstrip())[0]
+             for line in islice(read_lines(find_input(infile)), MAX_WORDS)]
+    print 'Words:', len(words)
+
+    differences = 0
+    for word in words:
+        if classify(word) != classify_reference(word):
+            differences += 1
+            if differences <= 10:
+                print ('DIFFERENT ROUTING: ' + word).encode('utf-8')
+    if differences == 0:
+        print 'Routing: identical -- success!'
+    else:
+        print 'Routing: different for', differences, 'words -- uh-oh.'
+
+    differences = 0
+    for word in words:
+        if hyphen_tokens(word) != hyphen_tokens_reference(word):
+            differences += 1
+            if differences <= 10:
+                print ('DIFFERENT HYPHENS: ' + word).encode('utf-8')
+    if differences == 0:
+        print 'Hyphens: identical -- success!'
+    else:
+        print 'Hyphens: different for', differences, 'words -- uh-oh.'
+
+    reference = benchmark(classify_reference, words)
+    single_pass = benchmark(classify, words)
+    print 'Original functions: ' + str(reference) + 's'
+    print 'classify:           ' + str(single_pass) + 's'
+    print 'Speedup:            ' + str(reference / max(single_pass, 1e-9))
+
+    reference = benchmark(hyphen_tokens_reference, words)
+    single_pass = benchmark(hyphen_tokens, words)
+    print 'Original hyphens:   ' + str(reference) + 's'
+    print 'hyphen_tokens:      ' + str(single_pass) + 's'
+    print 'Speedup:            ' + str(reference / max(single_pass, 1e-9))
+
+
+if __name__ == '__main__':
+    main('words/words.raw')